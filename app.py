@@ -4,18 +4,16 @@ Streamlit app entrypoint for Subway Systems Visualization.
 Main app with three tabs: Ingest, Map, and Plots.
 """
 
+import importlib
+import pandas as pd
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from typing import Optional, Tuple
 
 from src.ingest import render_ingest_tab
-from src.map.map_view import render_map_view
-from src.plots import render_plots_tab
-from src.profile.panel import render_profile_panel
-from src.state import initialize_session_state
-from src.colors import (
-    BACKGROUND_COLOR,
-    TEXT_COLOR,
-    DATAFRAME_BACKGROUND_COLOR
-)
+from src.state import get_data_version, get_df_core, initialize_session_state, set_df_core
+from src.colors import CSS_BUNDLE
 
 # Configure page
 st.set_page_config(
@@ -25,66 +23,233 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Custom CSS for black background and white lines
-st.markdown(f"""
-    <style>
-    .stApp {{
-        background-color: {BACKGROUND_COLOR};
-        color: {TEXT_COLOR};
-    }}
-    .stMarkdown, .stText {{
-        color: {TEXT_COLOR};
-    }}
-    /* Keep data visualizations readable */
-    [data-testid="stDataFrame"] {{
-        background-color: {DATAFRAME_BACKGROUND_COLOR};
-    }}
-    </style>
-    """, unsafe_allow_html=True)
+# Map view modes offered in the Map tab (see parse_view_mode in src/map/map_view.py)
+_MAP_VIEW_MODES = (
+    "Default",
+    "Size by Number of Lines",
+    "Size by Total Miles",
+    "Color by Visited Status",
+    "Color by Opening Date"
+)
 
+# Modules imported in the background while the S3 check runs. The plotting
+# libraries are imported lazily by the tab modules, so warm them explicitly.
+_WARM_MODULES = ("src.plots", "src.map.map_view", "plotly.graph_objects", "pydeck")
 
-def main():
-    """Main app function."""
-    initialize_session_state()
+
+def _s3_configured() -> bool:
+    """
+    Check whether AWS settings are present in Streamlit secrets.
     
-    # One-time S3 check: determine if a usable preprocessed table exists and load it
-    if not st.session_state.s3_table_checked:
-        try:
-            from src.s3_storage import check_s3_table_exists, load_table_from_s3
-
-            if check_s3_table_exists():
-                df_s3 = load_table_from_s3()
-
-                # Treat S3 table as usable only if it loaded successfully and is non-empty
-                if df_s3 is not None and not df_s3.empty:
-                    st.session_state.df_core = df_s3
-                    st.session_state.s3_table_exists = True
-                    st.session_state.s3_table_loaded = True
-                    st.session_state.data_version = "s3_loaded"
-                else:
-                    st.session_state.s3_table_exists = False
-                    st.session_state.s3_table_loaded = False
-            else:
-                st.session_state.s3_table_exists = False
-                st.session_state.s3_table_loaded = False
-        except Exception:
-            # If S3 is not configured or there's an error, continue normally without S3
-            st.session_state.s3_table_exists = False
-            st.session_state.s3_table_loaded = False
-        finally:
-            st.session_state.s3_table_checked = True
+    Returns:
+        True if an [aws] section is configured, False otherwise
+    """
+    try:
+        return "aws" in st.secrets
+    except FileNotFoundError:
+        # No secrets file at all
+        return False
+
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def _cached_s3_probe(bucket_name: str, s3_key: str) -> Tuple[bool, Optional[str]]:
+    """
+    Probe S3 for the preprocessed table once per process instead of once per session.
     
-    st.title("Duff Metro:  Subway Systems Explorer")
-    st.markdown("")
+    Keyed on bucket name and S3 key so a configuration change invalidates the
+    cached result. The short TTL lets a newly uploaded table be picked up.
+    Only a definite answer is cached: any error other than a missing object
+    raises, so one S3 hiccup does not hide the table from every new session.
     
-    # If data is loaded (from S3 or ingest), show full app with tabs.
-    # Otherwise, go straight to the ingest workflow.
-    if st.session_state.s3_table_loaded or st.session_state.df_core is not None:
-        # Create tabs
-        tab1, tab2, tab3, tab4 = st.tabs(["Intro", "Ingest", "Map", "Plots"])
+    Args:
+        bucket_name: S3 bucket holding the preprocessed table
+        s3_key: S3 key of the preprocessed table
+        
+    Returns:
+        Tuple of (table exists, object ETag or None)
+        
+    Raises:
+        ClientError: For S3 errors other than 404 (failures are not cached)
+        ValueError: If AWS credentials are missing (failures are not cached)
+    """
+    from src.s3_storage import head_s3_table
+
+    etag = head_s3_table(bucket_name, s3_key)
+    return etag is not None, etag
+
+
+@st.cache_data(persist="disk", show_spinner=False)
+def _cached_load_table_from_s3(etag: str) -> pd.DataFrame:
+    """
+    Load the preprocessed table from S3 once per object version.
+    
+    The ETag is only used as the cache key, so the download and parse are
+    skipped for every session until the S3 object changes. The result is
+    persisted to Streamlit's on-disk cache so it also survives app restarts;
+    a changed ETag is a new key, so no TTL is needed (persisted caches
+    ignore TTLs anyway).
+    
+    Args:
+        etag: ETag of the S3 object, as returned by the existence probe
+        
+    Returns:
+        DataFrame loaded from S3
+        
+    Raises:
+        ValueError: If the table could not be loaded (failures are not cached)
+    """
+    from src.s3_storage import load_table_from_s3
+
+    df = load_table_from_s3()
+    if df is None:
+        raise ValueError("Failed to load table from S3")
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _prepare_df(_df: pd.DataFrame, data_version: str) -> pd.DataFrame:
+    """
+    Precompute the derived columns used by the Map and Plots tabs.
+    
+    Runs once per data version; every later rerun reuses the prepared frame.
+    The dataframe argument is not hashed (leading underscore), data_version
+    is the cache key. Cached as a resource so reruns don't copy the frame;
+    callers must treat it as read-only.
+    
+    Args:
+        _df: DataFrame with subway system data
+        data_version: Version identifier of the data
+        
+    Returns:
+        Copy of the DataFrame with numeric coordinates and a VISITED_IDX column
+    """
+    from src.colors import visited_to_idx
+    
+    df = _df.copy()
+    
+    # Geocoded coordinates can arrive as object dtype; make them float once
+    for col in ("LATITUDE", "LONGITUDE"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    
+    # Palette index for the "Color by Visited Status" map view
+    if "VISITED" in df.columns:
+        df["VISITED_IDX"] = visited_to_idx(df["VISITED"])
+    
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _map_view_slice(_df: pd.DataFrame, data_version: str) -> pd.DataFrame:
+    """
+    Project the prepared dataframe down to the columns the map reads.
+    
+    Cached per data version so map reruns never touch the unused columns.
+    
+    Args:
+        _df: DataFrame with subway system data
+        data_version: Version identifier of the data (cache key)
+        
+    Returns:
+        Prepared DataFrame restricted to MAP_COLUMNS present in the data
+    """
+    from src.map.map_view import MAP_COLUMNS
+    
+    df = _prepare_df(_df, data_version)
+    return df[[col for col in MAP_COLUMNS if col in df.columns]]
+
+
+def _select_system(system_id: Optional[str]) -> None:
+    """
+    Store a newly selected system and redraw every profile panel.
+    
+    A fragment rerun only redraws its own fragment, so the panel in the other
+    tab would keep showing the previous system. A changed selection therefore
+    reruns the whole app; an unchanged one does nothing, so this cannot loop.
+    
+    Args:
+        system_id: System ID picked in the calling fragment, or None
+    """
+    if system_id and system_id != st.session_state.get("selected_system_id"):
+        st.session_state.selected_system_id = system_id
+        st.rerun(scope="app")
+
+
+@st.fragment
+def _map_fragment(df: pd.DataFrame) -> None:
+    """
+    Render the Map tab body: view mode selector, map, and profile panel.
+    
+    Runs as a fragment so changing the view mode or selecting a system only
+    reruns this tab instead of the whole script.
+    
+    Args:
+        df: DataFrame with subway system data
+    """
+    # Imported lazily so pydeck is only loaded once there is data to map
+    from src.map.map_view import render_map_view
+    from src.profile.panel import render_profile_panel
+    
+    # Add selectbox for view mode
+    view_mode = st.selectbox(
+        "Map View Mode",
+        options=_MAP_VIEW_MODES,
+        index=0,  # Default to "Default"
+        key="map_view_mode",
+        help="Choose how to visualize subway systems on the map"
+    )
+    
+    # Create two columns: map on left, profile on right
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        # Render map and get selected system
+        selected_system_id = render_map_view(
+            _map_view_slice(df, get_data_version()),
+            view_mode=view_mode
+        )
         
-        with tab1:
-            st.markdown("""
+        # Update session state if selection changed
+        _select_system(selected_system_id)
+    
+    with col2:
+        # Show profile panel
+        render_profile_panel(df, st.session_state.get("selected_system_id"))
+
+
+@st.fragment
+def _plots_fragment(df: pd.DataFrame) -> None:
+    """
+    Render the Plots tab body: scatter plots and profile panel.
+    
+    Runs as a fragment so selecting a point only reruns this tab instead of
+    the whole script.
+    
+    Args:
+        df: DataFrame with subway system data
+    """
+    # Imported lazily so plotly is only loaded once there is data to plot
+    from src.plots import render_plots_tab
+    from src.profile.panel import render_profile_panel
+    
+    # Create two columns: plots on left, profile on right
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        # Render plots and get selected system
+        selected_system_id = render_plots_tab(_prepare_df(df, get_data_version()))
+        
+        # Update session state if selection changed
+        _select_system(selected_system_id)
+    
+    with col2:
+        # Show profile panel
+        render_profile_panel(df, st.session_state.get("selected_system_id"))
+
+
+def _render_intro_tab(df: Optional[pd.DataFrame], has_data: bool) -> None:
+    """Render the Intro tab."""
+    st.markdown("""
 Hi! I'm Lydia. 
 
 I have mission to ride all of the subway systems in the world built before 1985, and then some.  This website is where I'm collecting information,  synthesizing these experiences, and, with the kind help of a skillful friend, John Hamilton, helping us visualize the data.
@@ -99,68 +264,111 @@ Take a look at some of the data.
 Share your input to the Metro Lit syllabus.
 Enjoy getting to know places and people on their metros.
 Support sustainable urban and social development: ride metro systems yourselves.
-            """)
-        
-        with tab2:
-            render_ingest_tab()
+    """)
+
+
+def _render_map_tab(df: Optional[pd.DataFrame], has_data: bool) -> None:
+    """Render the Map tab, or a hint to upload data first."""
+    st.header("Map View")
+    
+    if not has_data:
+        st.info("Please upload data in the Ingest tab first.")
+    else:
+        _map_fragment(df)
+
+
+def _render_plots_tab(df: Optional[pd.DataFrame], has_data: bool) -> None:
+    """Render the Plots tab, or a hint to upload data first."""
+    st.header("Plots View")
+    
+    if not has_data:
+        st.info("Please upload data in the Ingest tab first.")
+    else:
+        _plots_fragment(df)
+
+
+def _render_ingest_tab(df: Optional[pd.DataFrame], has_data: bool) -> None:
+    """Render the Ingest tab."""
+    render_ingest_tab()
+
+
+# Tab renderers in display order; adding a tab only needs a new entry here.
+# Each takes the core dataframe and whether it holds any rows.
+_TAB_RENDERERS = {
+    "Intro": _render_intro_tab,
+    "Ingest": _render_ingest_tab,
+    "Map": _render_map_tab,
+    "Plots": _render_plots_tab,
+}
+_TABS = tuple(_TAB_RENDERERS)
+
+
+def main():
+    """Main app function."""
+    initialize_session_state()
+    
+    # Re-emitted on every run: Streamlit drops elements a rerun does not emit,
+    # so injecting the style block only once per session would lose it
+    st.markdown(CSS_BUNDLE, unsafe_allow_html=True)
+    
+    # One-time S3 check per session: determine if a usable preprocessed table exists and load it
+    if not st.session_state.s3_table_checked:
+        st.session_state.s3_table_checked = True
         
-        with tab3:
-            st.header("Map View")
-            df = st.session_state.get("df_core")
-            
-            if df is None or df.empty:
-                st.info("Please upload data in the Ingest tab first.")
-            else:
-                # Add selectbox for view mode
-                view_mode = st.selectbox(
-                    "Map View Mode",
-                    options=[
-                        "Default",
-                        "Size by Number of Lines",
-                        "Size by Total Miles",
-                        "Color by Visited Status",
-                        "Color by Opening Date"
-                    ],
-                    index=0,  # Default to "Default"
-                    help="Choose how to visualize subway systems on the map"
-                )
-                
-                # Create two columns: map on left, profile on right
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    # Render map and get selected system
-                    selected_system_id = render_map_view(df, view_mode=view_mode)
-                    
-                    # Update session state if selection changed
-                    if selected_system_id:
-                        st.session_state.selected_system_id = selected_system_id
-                
-                with col2:
-                    # Show profile panel
-                    render_profile_panel(df, st.session_state.get("selected_system_id"))
-            
-        with tab4:
-            st.header("Plots View")
-            df = st.session_state.get("df_core")
-            
-            if df is None or df.empty:
-                st.info("Please upload data in the Ingest tab first.")
-            else:
-                # Create two columns: plots on left, profile on right
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    # Render plots and get selected system
-                    selected_system_id = render_plots_tab(df)
-                    
-                    # Update session state if selection changed
-                    if selected_system_id:
-                        st.session_state.selected_system_id = selected_system_id
+        # Without AWS settings there is nothing to check, so skip importing boto3 entirely
+        if not _s3_configured():
+            st.session_state.s3_table_exists = False
+            st.session_state.s3_table_loaded = False
+        else:
+            try:
+                from src.s3_storage import get_s3_config
+
+                # Overlap the S3 round-trips with importing the map and plots modules.
+                # Workers get this run's script context so Streamlit calls work there.
+                with ThreadPoolExecutor(
+                    max_workers=3,
+                    initializer=add_script_run_ctx,
+                    initargs=(None, get_script_run_ctx())
+                ) as executor:
+                    probe = executor.submit(_cached_s3_probe, *get_s3_config())
+                    for module_name in _WARM_MODULES:
+                        executor.submit(importlib.import_module, module_name)
                 
-                with col2:
-                    # Show profile panel
-                    render_profile_panel(df, st.session_state.get("selected_system_id"))
+                    s3_exists, etag = probe.result()
+                    if s3_exists:
+                        df_s3 = _cached_load_table_from_s3(etag)
+                        # Version the S3 table by its ETag so derived caches follow object changes
+                        s3_version = "s3_" + etag.strip('"')
+
+                        # Treat S3 table as usable only if it loaded successfully and is non-empty
+                        if df_s3 is not None and not df_s3.empty:
+                            set_df_core(df_s3, s3_version)
+                            st.session_state.s3_table_exists = True
+                            st.session_state.s3_table_loaded = True
+                        else:
+                            st.session_state.s3_table_exists = False
+                            st.session_state.s3_table_loaded = False
+                    else:
+                        st.session_state.s3_table_exists = False
+                        st.session_state.s3_table_loaded = False
+            except Exception:
+                # If S3 is not configured or there's an error, continue normally without S3
+                st.session_state.s3_table_exists = False
+                st.session_state.s3_table_loaded = False
+    
+    # Look the session's table up once per run and hand it to every tab
+    df = get_df_core()
+    has_data = df is not None and not df.empty
+    
+    st.title("Duff Metro:  Subway Systems Explorer")
+    st.markdown("")
+    
+    # If data is loaded (from S3 or ingest), show full app with tabs.
+    # Otherwise, go straight to the ingest workflow.
+    if st.session_state.s3_table_loaded or df is not None:
+        for tab, tab_name in zip(st.tabs(_TABS), _TABS):
+            with tab:
+                _TAB_RENDERERS[tab_name](df, has_data)
     else:
         # No usable data yet: go straight to the ingest workflow
         render_ingest_tab()
@@ -6,43 +6,151 @@ This module provides a single source of truth for all color values used
 throughout the application.
 """
 
+import types
+
+import numpy as np
+import pandas as pd
+
+
+def _hex_to_rgba(hex_color: str, alpha: int = 255) -> tuple:
+    """Convert a "#RRGGBB" hex string to an (R, G, B, A) tuple."""
+    return (int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16), alpha)
+
+
 # UI/Theme Colors (Hex format for CSS)
 BACKGROUND_COLOR = "#FFFFFF"
 TEXT_COLOR = "#000000"
 DATAFRAME_BACKGROUND_COLOR = "#F5F5F5"
 
 # UI/Theme Colors (RGB format for Python/PyDeck)
-# RGB values as [R, G, B, A] where each component is 0-255
-BACKGROUND_RGB = [255, 255, 255, 255]
-TEXT_RGB = [0, 0, 0, 255]
-DATAFRAME_BACKGROUND_RGB = [245, 245, 245, 255]
+# RGB values as (R, G, B, A) where each component is 0-255, derived from the hex values above
+BACKGROUND_RGB = _hex_to_rgba(BACKGROUND_COLOR)
+TEXT_RGB = _hex_to_rgba(TEXT_COLOR)
+DATAFRAME_BACKGROUND_RGB = _hex_to_rgba(DATAFRAME_BACKGROUND_COLOR)
+
+# App-wide CSS, formatted once at import time
+CSS_BUNDLE = f"""
+    <style>
+    .stApp {{
+        background-color: {BACKGROUND_COLOR};
+        color: {TEXT_COLOR};
+    }}
+    .stMarkdown, .stText {{
+        color: {TEXT_COLOR};
+    }}
+    /* Keep data visualizations readable */
+    [data-testid="stDataFrame"] {{
+        background-color: {DATAFRAME_BACKGROUND_COLOR};
+    }}
+    </style>
+    """
 
 # Default Map Point Color (RGB format) - Royal Blue
-DEFAULT_POINT_COLOR = [100, 149, 237, 200]  # Royal blue (CornflowerBlue-ish, soft but darker)
+DEFAULT_POINT_COLOR = (100, 149, 237, 200)  # Royal blue (CornflowerBlue-ish, soft but darker)
 
 # Visited Status Colors (RGB format) - Soft Green and Soft Red
-VISITED_COLORS = {
-    True: [152, 223, 138, 255],   # Soft green
-    False: [255, 182, 193, 255],   # Soft red (LightPink-ish)
-    None: [128, 128, 128, 150]    # Gray for unknown
-}
+# Palette lookups are read-only mappings of immutable (R, G, B, A) tuples
+VISITED_COLORS = types.MappingProxyType({
+    True: (152, 223, 138, 255),   # Soft green
+    False: (255, 182, 193, 255),   # Soft red (LightPink-ish)
+    None: (128, 128, 128, 150)    # Gray for unknown
+})
 
 # Opening Date Colors (RGB format) - Pre-1985 (soft orange) and 1985+ (royal blue)
-OPENING_DATE_COLORS = {
-    "pre-1985": [255, 218, 185, 255],   # Soft orange (PeachPuff-ish)
-    "1985+": [100, 149, 237, 255],       # Royal blue (CornflowerBlue-ish, soft but darker)
-    "unknown": [128, 128, 128, 150]     # Gray for missing data
-}
+OPENING_DATE_COLORS = types.MappingProxyType({
+    "pre-1985": (255, 218, 185, 255),   # Soft orange (PeachPuff-ish)
+    "1985+": (100, 149, 237, 255),       # Royal blue (CornflowerBlue-ish, soft but darker)
+    "unknown": (128, 128, 128, 150)     # Gray for missing data
+})
 
 # Date Bucket Colors (RGB format) - Kept for backwards compatibility but not used for opening date
-DATE_BUCKET_COLORS = {
-    "pre-1950": [255, 100, 100, 200],      # Red
-    "1950-1979": [255, 200, 100, 200],     # Orange
-    "1980-1999": [255, 255, 100, 200],     # Yellow
-    "2000-2014": [100, 255, 100, 200],     # Green
-    "2015+": [100, 200, 255, 200],         # Blue
-    "unknown": [128, 128, 128, 150]        # Gray for missing data
-}
+DATE_BUCKET_COLORS = types.MappingProxyType({
+    "pre-1950": (255, 100, 100, 200),      # Red
+    "1950-1979": (255, 200, 100, 200),     # Orange
+    "1980-1999": (255, 255, 100, 200),     # Yellow
+    "2000-2014": (100, 255, 100, 200),     # Green
+    "2015+": (100, 200, 255, 200),         # Blue
+    "unknown": (128, 128, 128, 150)        # Gray for missing data
+})
+
+# Palette lookup tables as uint8 arrays for vectorized coloring.
+# Row order follows the matching *_KEYS tuple, so colors for a whole column can
+# be gathered in one step, e.g. VISITED_COLORS_ARR[visited_to_idx(df["VISITED"])]
+VISITED_KEYS = (True, False, None)
+VISITED_COLORS_ARR = np.array([VISITED_COLORS[k] for k in VISITED_KEYS], dtype=np.uint8)
+
+OPENING_DATE_KEYS = ("pre-1985", "1985+", "unknown")
+OPENING_DATE_COLORS_ARR = np.array([OPENING_DATE_COLORS[k] for k in OPENING_DATE_KEYS], dtype=np.uint8)
+
+DATE_BUCKET_KEYS = tuple(DATE_BUCKET_COLORS)
+DATE_BUCKET_COLORS_ARR = np.array([DATE_BUCKET_COLORS[k] for k in DATE_BUCKET_KEYS], dtype=np.uint8)
+
+# String answers of yes/no style columns such as VISITED; matched after
+# stripping and lowercasing
+YES_VALUES = ("yes", "true", "y", "1")
+NO_VALUES = ("no", "false", "n", "0")
+
+# Display labels for yes_no_to_idx indices
+YES_NO_LABELS = np.array(["Yes", "No", "Unknown"], dtype=object)
+
+
+def yes_no_to_idx(series: pd.Series, other_text: int = 2) -> np.ndarray:
+    """
+    Classify a yes/no style column ("yes", "True", booleans, ...).
+    
+    Only real bool and str values are answers. Missing values and any other
+    types (e.g. the numbers 1 and 0) are unknown.
+    
+    Args:
+        series: Column to classify
+        other_text: Index for strings that are neither a yes nor a no value
+        
+    Returns:
+        uint8 array of indices (0 = yes, 1 = no, 2 = unknown)
+    """
+    values = series.to_numpy(dtype=object)
+    is_bool = np.fromiter((isinstance(v, bool) for v in values), dtype=bool, count=len(values))
+    is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+    
+    idx = np.full(len(values), 2, dtype=np.uint8)
+    idx[is_bool] = np.where(values[is_bool].astype(bool), 0, 1)
+    normalized = pd.Series(values[is_str], dtype=object).str.strip().str.lower()
+    idx[is_str] = np.select(
+        [normalized.isin(YES_VALUES).to_numpy(dtype=bool), normalized.isin(NO_VALUES).to_numpy(dtype=bool)],
+        [0, 1],
+        default=other_text
+    )
+    return idx
+
+
+def format_yes_no(series: pd.Series) -> np.ndarray:
+    """
+    Format a yes/no style column for display.
+    
+    Args:
+        series: Column to format
+        
+    Returns:
+        Array of "Yes", "No" or "Unknown"
+    """
+    return YES_NO_LABELS[yes_no_to_idx(series)]
+
+
+def visited_to_idx(series: pd.Series) -> np.ndarray:
+    """
+    Map a VISITED column to row indices into VISITED_COLORS_ARR.
+    
+    Same rules as yes_no_to_idx, except that any string that is not a yes
+    value counts as not visited.
+    
+    Args:
+        series: VISITED column
+        
+    Returns:
+        uint8 array of indices (0 = visited, 1 = not visited, 2 = unknown)
+    """
+    return yes_no_to_idx(series, other_text=1)
+
 
 # Tooltip Colors (for PyDeck map tooltips)
 # Matching Plotly's default tooltip styling: white background, black text, subtle border
@@ -1,23 +1,76 @@
 """
 Geocoding module for inferring latitude and longitude from city and country.
 
-Uses geopy with Nominatim to geocode locations and caches results in session state.
+Uses geopy with Nominatim to geocode locations and caches results in session state,
+backed by a persistent SQLite cache (see src/geocode_cache.py).
 """
 
+import numpy as np
 import pandas as pd
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-from typing import Tuple, Optional, List
-import time
+from geopy.extra.rate_limiter import RateLimiter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from typing import Callable, Tuple, Optional, List
+import re
 import ssl
+import unicodedata
 import certifi
 
+from src import geocode_cache
 
-def get_geocoder() -> Nominatim:
+# Public Nominatim instance and its usage policy (one request per second).
+# A self-hosted instance can be configured in the [geocoding] secrets section.
+_DEFAULT_DOMAIN = "nominatim.openstreetmap.org"
+_DEFAULT_MIN_DELAY_SECONDS = 1.0
+
+# Concurrent geocoding requests; the shared rate limiter still spaces their starts
+_GEOCODE_WORKERS = 4
+
+# Parenthetical remarks such as "(Metro)" or "(D.C.)"
+_PARENTHETICAL_RE = re.compile(r"\([^)]*\)")
+
+# Seconds to wait for a Nominatim response before the rate limiter retries
+_GEOCODE_TIMEOUT = 15
+
+
+def get_geocoding_config() -> Tuple[str, float, int]:
+    """
+    Get Nominatim settings from the optional [geocoding] secrets section.
+    
+    Supported keys are domain, min_delay_seconds and workers. Without the
+    section the public Nominatim instance and its rate limit are used; a
+    self-hosted instance can lower the delay and raise the worker count.
+    
+    Returns:
+        Tuple of (domain, min_delay_seconds, workers)
+    """
+    try:
+        settings = st.secrets.get("geocoding", {})
+    except FileNotFoundError:
+        # No secrets file at all
+        settings = {}
+    return (
+        settings.get("domain", _DEFAULT_DOMAIN),
+        float(settings.get("min_delay_seconds", _DEFAULT_MIN_DELAY_SECONDS)),
+        int(settings.get("workers", _GEOCODE_WORKERS))
+    )
+
+
+@lru_cache(maxsize=1)
+def get_geocoder(domain: str = _DEFAULT_DOMAIN) -> Nominatim:
     """
     Get a Nominatim geocoder instance with SSL context configured.
     
+    Built once per process so every lookup reuses the same SSL context and
+    the adapter's keep-alive HTTP session instead of a new TLS handshake.
+    
+    Args:
+        domain: Nominatim host to query
+        
     Returns:
         Nominatim geocoder instance
     """
@@ -26,6 +79,7 @@ def get_geocoder() -> Nominatim:
         ssl_context = ssl.create_default_context(cafile=certifi.where())
         return Nominatim(
             user_agent="duff_metro_app",
+            domain=domain,
             scheme="https",
             ssl_context=ssl_context
         )
@@ -37,45 +91,126 @@ def get_geocoder() -> Nominatim:
         ssl_context.verify_mode = ssl.CERT_NONE
         return Nominatim(
             user_agent="duff_metro_app",
+            domain=domain,
             scheme="https",
             ssl_context=ssl_context
         )
 
 
-def geocode_location(city: str, country: str, cache: dict) -> Optional[Tuple[float, float]]:
+def clean_location(text: str) -> str:
+    """
+    Clean a city or country name for use in a geocoding query.
+    
+    Drops parenthetical remarks and collapses whitespace, keeping the
+    original spelling and script.
+    
+    Args:
+        text: City or country name
+        
+    Returns:
+        Cleaned name
+    """
+    return " ".join(_PARENTHETICAL_RE.sub(" ", text).split())
+
+
+def normalize_location(text: str) -> str:
+    """
+    Normalize a city or country name for deduplication and cache keys.
+    
+    Cleans the name, then drops accents and case-folds it, so spelling
+    variants of one place share a cache entry. Letters without an accent-free
+    form (e.g. "ø" or non-Latin scripts) are kept, so no name folds to "".
+    
+    Args:
+        text: City or country name
+        
+    Returns:
+        Normalized name
+    """
+    text = unicodedata.normalize("NFKD", clean_location(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.casefold()
+
+
+def get_rate_limited_geocode(
+    geolocator: Nominatim,
+    min_delay_seconds: float = _DEFAULT_MIN_DELAY_SECONDS
+) -> Callable:
+    """
+    Wrap a geocoder's geocode method in a rate limiter.
+    
+    Nominatim's usage policy allows one request per second. The limiter is
+    thread-safe, so a single instance can gate every worker of a pool.
+    
+    Args:
+        geolocator: Geocoder whose geocode method is wrapped
+        min_delay_seconds: Minimum spacing between request starts
+        
+    Returns:
+        Callable with the same signature as geolocator.geocode
+    """
+    return RateLimiter(
+        geolocator.geocode,
+        min_delay_seconds=min_delay_seconds,
+        max_retries=2,
+        error_wait_seconds=2,
+        swallow_exceptions=False
+    )
+
+
+def geocode_location(
+    city: str,
+    country: str,
+    cache: dict,
+    geocode: Optional[Callable] = None
+) -> Optional[Tuple[float, float]]:
     """
     Geocode a city and country to get latitude and longitude.
     
-    Uses caching to avoid repeated API calls. Constructs query as "{CITY}, {COUNTRY}".
+    Uses caching to avoid repeated API calls. Sends a structured city/country
+    query with the cleaned original names; caches under the normalized
+    "{city}, {country}".
     
     Args:
         city: City name
         country: Country name
-        cache: Dictionary to cache geocoding results (key: query string, value: (lat, lon))
+        cache: Dictionary to cache geocoding results (key: normalized query string, value: (lat, lon))
+        geocode: Rate-limited geocode callable to use (if None, a new one is created)
         
     Returns:
         Tuple of (latitude, longitude) if successful, None otherwise
     """
-    # Construct query
-    query = f"{city}, {country}"
+    # Construct query; the normalized form is only the cache key
+    query = f"{normalize_location(city)}, {normalize_location(country)}"
     
     # Check cache first
     if query in cache:
         return cache[query]
     
+    # Then the persistent cache, which outlives the session
+    found, result = geocode_cache.lookup(query)
+    if found:
+        cache[query] = result
+        return result
+    
     # Geocode
     try:
-        geolocator = get_geocoder()
-        location = geolocator.geocode(query, timeout=10)
+        if geocode is None:
+            geocode = get_rate_limited_geocode(get_geocoder())
+        location = geocode(
+            {"city": clean_location(city), "country": clean_location(country)},
+            timeout=_GEOCODE_TIMEOUT
+        )
         
         if location:
             result = (location.latitude, location.longitude)
             cache[query] = result
-            # Small delay to respect rate limits
-            time.sleep(0.5)
+            geocode_cache.store(query, result)
             return result
         else:
+            # A definitive "not found" is persisted; errors below are not
             cache[query] = None
+            geocode_cache.store(query, None)
             return None
     except (GeocoderTimedOut, GeocoderServiceError) as e:
         st.warning(f"Geocoding error for {query}: {str(e)}")
@@ -110,32 +245,50 @@ def add_coordinates_to_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[s
     
     cache = st.session_state.geocoding_cache
     
-    # Initialize columns if they don't exist
-    if "LATITUDE" not in df_copy.columns:
-        df_copy["LATITUDE"] = None
-    if "LONGITUDE" not in df_copy.columns:
-        df_copy["LONGITUDE"] = None
-    
-    # Geocode rows that don't have coordinates
-    for idx, row in df_copy.iterrows():
-        # Skip if already has coordinates
-        if pd.notna(row.get("LATITUDE")) and pd.notna(row.get("LONGITUDE")):
-            continue
-        
-        city = str(row.get("CITY", "")).strip()
-        country = str(row.get("COUNTRY", "")).strip()
-        
-        if not city or not country:
-            unresolved.append(f"{city}, {country}")
-            continue
-        
-        coords = geocode_location(city, country, cache)
+    # Existing coordinates as float64 arrays (NaN where missing or unparseable)
+    lat, lon = (
+        pd.to_numeric(df_copy[col], errors="coerce").to_numpy(dtype=float, copy=True)
+        if col in df_copy.columns else np.full(len(df_copy), np.nan)
+        for col in ("LATITUDE", "LONGITUDE")
+    )
+    
+    # Rows that still need coordinates, found in one vectorized pass
+    missing_positions = np.flatnonzero(np.isnan(lat) | np.isnan(lon))
+    locations = df_copy.reindex(columns=["CITY", "COUNTRY"], fill_value="").to_numpy()
+    pending = []
+    for pos in missing_positions:
+        city, country = str(locations[pos, 0]).strip(), str(locations[pos, 1]).strip()
+        key = (normalize_location(city), normalize_location(country))
+        pending.append((pos, city, country, key))
+    
+    # Geocode each distinct uncached location once, overlapping the HTTP round-trips.
+    # Workers get this run's script context so st.warning works from the pool.
+    to_geocode = {}
+    for _, city, country, key in pending:
+        if all(key) and f"{key[0]}, {key[1]}" not in cache:
+            to_geocode.setdefault(key, (city, country))
+    if to_geocode:
+        domain, min_delay_seconds, workers = get_geocoding_config()
+        geocode = get_rate_limited_geocode(get_geocoder(domain), min_delay_seconds)
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(workers, len(to_geocode))),
+            initializer=add_script_run_ctx,
+            initargs=(None, get_script_run_ctx())
+        ) as executor:
+            for city, country in to_geocode.values():
+                executor.submit(geocode_location, city, country, cache, geocode)
+    
+    # Fill in results by position, in row order
+    for pos, city, country, key in pending:
+        coords = cache.get(f"{key[0]}, {key[1]}") if all(key) else None
         
         if coords:
-            df_copy.at[idx, "LATITUDE"] = coords[0]
-            df_copy.at[idx, "LONGITUDE"] = coords[1]
+            lat[pos], lon[pos] = coords
         else:
             unresolved.append(f"{city}, {country}")
     
+    # One assignment per column keeps the coordinates float64 instead of object
+    df_copy["LATITUDE"] = lat
+    df_copy["LONGITUDE"] = lon
+    
     return df_copy, unresolved
-
@@ -0,0 +1,113 @@
+"""
+Persistent geocoding cache backed by SQLite.
+
+Sits underneath the in-memory session cache so geocoded locations survive
+session ends and app restarts. Any SQLite failure degrades to a cache miss.
+"""
+
+import sqlite3
+import threading
+import streamlit as st
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Database file at the project root (next to app.py)
+_DB_PATH = Path(__file__).resolve().parent.parent / "geocode_cache.db"
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a geocoding query for use as a cache key.
+
+    Lowercases and collapses whitespace so casing and spacing variants of the
+    same location share one entry.
+
+    Args:
+        query: Query string such as "New York, United States"
+
+    Returns:
+        Normalized query string
+    """
+    return " ".join(query.lower().split())
+
+
+@st.cache_resource(show_spinner=False)
+def get_geocode_db() -> dict:
+    """
+    Open the process-wide geocoding cache database.
+
+    The connection is shared across sessions and geocoding worker threads;
+    writes are serialized by the lock.
+
+    Returns:
+        Dictionary with "conn" (sqlite3 connection, or None if the database
+        could not be opened) and "lock"
+    """
+    try:
+        conn = sqlite3.connect(_DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "query TEXT PRIMARY KEY, lat REAL, lon REAL, miss INTEGER NOT NULL)"
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn = None
+    return {"conn": conn, "lock": threading.Lock()}
+
+
+def lookup(query: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+    """
+    Look up a query in the persistent cache.
+
+    Args:
+        query: Query string ("{CITY}, {COUNTRY}")
+
+    Returns:
+        Tuple of (found, coordinates). Coordinates are None for a cached
+        "no result" answer.
+    """
+    db = get_geocode_db()
+    if db["conn"] is None:
+        return False, None
+
+    try:
+        with db["lock"]:
+            row = db["conn"].execute(
+                "SELECT lat, lon, miss FROM cache WHERE query = ?",
+                (normalize_query(query),)
+            ).fetchone()
+    except sqlite3.Error:
+        return False, None
+
+    if row is None:
+        return False, None
+    lat, lon, miss = row
+    return True, None if miss else (lat, lon)
+
+
+def store(query: str, coords: Optional[Tuple[float, float]]) -> None:
+    """
+    Store a geocoding answer in the persistent cache.
+
+    Only definitive answers should be stored; transient errors (timeouts,
+    service errors) must not be cached.
+
+    Args:
+        query: Query string ("{CITY}, {COUNTRY}")
+        coords: (latitude, longitude), or None if the geocoder found nothing
+    """
+    db = get_geocode_db()
+    if db["conn"] is None:
+        return
+
+    lat, lon = coords if coords else (None, None)
+    try:
+        with db["lock"]:
+            db["conn"].execute(
+                "INSERT OR REPLACE INTO cache (query, lat, lon, miss) VALUES (?, ?, ?, ?)",
+                (normalize_query(query), lat, lon, int(coords is None))
+            )
+            db["conn"].commit()
+    except sqlite3.Error:
+        pass
@@ -5,14 +5,32 @@ Handles Excel file upload, sheet selection, data cleaning, validation,
 and storage in session state.
 """
 
+import hashlib
+import io
 import pandas as pd
 import streamlit as st
 from typing import Optional, Tuple
 
 from src.validate import validate_dataframe, ValidationError
-from src.state import compute_data_version, initialize_session_state
+from src.state import (
+    compute_data_version,
+    get_data_version,
+    get_df_core,
+    initialize_session_state,
+    set_df_core
+)
 from src.geocode import add_coordinates_to_dataframe
 
+# Rows shown in the Data Preview before "Show all rows" is switched on
+_PREVIEW_ROWS = 200
+
+# Rust-backed calamine reader when python-calamine is installed, openpyxl otherwise
+try:
+    import python_calamine  # noqa: F401
+    _EXCEL_ENGINE = "calamine"
+except ImportError:
+    _EXCEL_ENGINE = "openpyxl"
+
 
 def create_dummy_dataframe() -> pd.DataFrame:
     """
@@ -36,10 +54,29 @@ def create_dummy_dataframe() -> pd.DataFrame:
     return pd.DataFrame(dummy_data)
 
 
+def get_excel_file(file_bytes: bytes) -> pd.ExcelFile:
+    """
+    Open an Excel workbook with the fastest available engine.
+    
+    Not cached: an ExcelFile is a stateful reader, so each caller opens its
+    own and closes it. The cached helpers below hold the values read from it.
+    
+    Args:
+        file_bytes: Bytes of the Excel file
+        
+    Returns:
+        Open ExcelFile for the workbook
+    """
+    return pd.ExcelFile(io.BytesIO(file_bytes), engine=_EXCEL_ENGINE)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
 def load_excel_sheet(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
     """
     Load a specific sheet from an Excel file.
     
+    Cached on the file bytes and sheet name, so each sheet is parsed once.
+    
     Args:
         file_bytes: Bytes of the Excel file
         sheet_name: Name of the sheet to load
@@ -47,23 +84,61 @@ def load_excel_sheet(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
     Returns:
         DataFrame from the specified sheet
     """
-    return pd.read_excel(file_bytes, sheet_name=sheet_name, engine='openpyxl')
+    with get_excel_file(file_bytes) as excel_file:
+        return excel_file.parse(sheet_name)
 
 
+@st.cache_data(show_spinner=False, max_entries=4)
 def get_excel_sheet_names(file_bytes: bytes) -> list:
     """
     Get list of sheet names from an Excel file.
     
+    Cached on the file bytes, so reruns of the Ingest tab don't reopen the workbook.
+    
     Args:
         file_bytes: Bytes of the Excel file
         
     Returns:
         List of sheet names
     """
-    xl_file = pd.ExcelFile(file_bytes, engine='openpyxl')
-    return xl_file.sheet_names
+    with get_excel_file(file_bytes) as excel_file:
+        return excel_file.sheet_names
+
+
+def _downcast(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store columns in the smallest dtypes that hold their values exactly.
+    
+    Integer columns are downcast to the narrowest integer type, float columns
+    to float32 only when no value changes, and VISITED becomes a category.
+    
+    Args:
+        df: Cleaned DataFrame
+        
+    Returns:
+        DataFrame with downcast columns
+    """
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series.dtype):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series.dtype):
+            narrowed = pd.to_numeric(series, downcast="float")
+            # float32 would change the displayed digits of most decimals
+            if narrowed.astype("float64").equals(series):
+                df[col] = narrowed
+    
+    if "VISITED" in df.columns:
+        df["VISITED"] = df["VISITED"].astype("category")
+    
+    return df
 
 
+@st.cache_data(
+    show_spinner=False,
+    max_entries=4,
+    hash_funcs={bytes: lambda b: hashlib.blake2b(b, digest_size=16).digest()}
+)
 def process_excel_upload(
     file_bytes: bytes, 
     selected_sheet: Optional[str] = None
@@ -71,6 +146,9 @@ def process_excel_upload(
     """
     Process an uploaded Excel file through validation and cleaning.
     
+    Cached on (file bytes, sheet), so reprocessing the same upload skips
+    parsing, validation and hashing entirely.
+    
     Args:
         file_bytes: Bytes of the uploaded Excel file
         selected_sheet: Name of the sheet to load (if None, loads first sheet)
@@ -100,6 +178,7 @@ def process_excel_upload(
         
         # Validate and clean
         df_cleaned, validation_issues = validate_dataframe(df_raw)
+        df_cleaned = _downcast(df_cleaned)
         
         # Compute data version
         data_version = compute_data_version(file_bytes)
@@ -112,6 +191,20 @@ def process_excel_upload(
         return None, None, [f"Error processing Excel file: {str(e)}"]
 
 
+def load_dummy_data() -> None:
+    """
+    Geocode the dummy dataframe and store it as the core data.
+    
+    Used as the "Load Dummy Data" button callback.
+    """
+    dummy_df = create_dummy_dataframe()
+    # Add geocoding for dummy data too
+    with st.spinner("Geocoding locations..."):
+        df_with_coords, unresolved = add_coordinates_to_dataframe(dummy_df)
+        dummy_df = df_with_coords
+    set_df_core(dummy_df, "dummy_data_v1")
+
+
 def render_ingest_tab():
     """
     Render the Ingest tab UI for Excel file upload and preview.
@@ -178,8 +271,7 @@ def render_ingest_tab():
                                 st.warning(f"⚠️ Could not geocode {len(unresolved)} location(s): {', '.join(unresolved[:5])}")
                         
                         # Store in session state
-                        st.session_state.df_core = df_cleaned
-                        st.session_state.data_version = data_version
+                        set_df_core(df_cleaned, data_version)
                         
                         # Save to S3
                         try:
@@ -208,37 +300,36 @@ def render_ingest_tab():
             st.error(f"Error reading Excel file: {str(e)}")
     
     # Show current dataframe if available
-    if st.session_state.df_core is not None:
+    df_core = get_df_core()
+    if df_core is not None:
+        data_version = get_data_version()
         st.divider()
         st.subheader("📊 Data Preview")
-        st.dataframe(st.session_state.df_core, use_container_width=True)
+        # Only the first rows are sent to the browser unless all rows are requested
+        show_all = len(df_core) <= _PREVIEW_ROWS or st.toggle(
+            "Show all rows",
+            help=f"The preview shows the first {_PREVIEW_ROWS} rows by default"
+        )
+        st.dataframe(df_core if show_all else df_core.head(_PREVIEW_ROWS), use_container_width=True)
         
         st.subheader("📈 Data Summary")
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Systems", len(st.session_state.df_core))
+            st.metric("Total Systems", len(df_core))
         with col2:
-            st.metric("Columns", len(st.session_state.df_core.columns))
+            st.metric("Columns", len(df_core.columns))
         with col3:
-            if st.session_state.data_version:
-                st.metric("Data Version", st.session_state.data_version[:8] + "...")
+            if data_version:
+                st.metric("Data Version", data_version[:8] + "...")
         
         # Show column info
         with st.expander("Column Information"):
-            st.json(list(st.session_state.df_core.columns))
+            st.json(list(df_core.columns))
     else:
         # Show dummy data option
         st.divider()
         st.info("💡 No data uploaded yet. Use the file uploader above, or load dummy data to explore the app.")
         
-        if st.button("Load Dummy Data", type="secondary"):
-            dummy_df = create_dummy_dataframe()
-            # Add geocoding for dummy data too
-            with st.spinner("Geocoding locations..."):
-                df_with_coords, unresolved = add_coordinates_to_dataframe(dummy_df)
-                dummy_df = df_with_coords
-            st.session_state.df_core = dummy_df
-            st.session_state.data_version = "dummy_data_v1"
-            st.success("✅ Dummy data loaded!")
-            st.rerun()
-
+        # Loading in the click callback stores the data before the rerun starts,
+        # so the app switches to the tabbed layout without a second st.rerun()
+        st.button("Load Dummy Data", type="secondary", on_click=load_dummy_data)
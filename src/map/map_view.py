@@ -4,38 +4,89 @@ Map view module for rendering subway systems on a PyDeck map.
 Handles map rendering with click selection to set selected_system_id.
 """
 
+import numpy as np
 import pandas as pd
 import streamlit as st
-import pydeck as pdk
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, Union
 
 from src.colors import (
     OPENING_DATE_COLORS,
-    VISITED_COLORS,
+    OPENING_DATE_COLORS_ARR,
+    VISITED_COLORS_ARR,
     DEFAULT_POINT_COLOR,
     TOOLTIP_BACKGROUND_COLOR,
     TOOLTIP_TEXT_COLOR,
-    TOOLTIP_BORDER_COLOR
+    TOOLTIP_BORDER_COLOR,
+    format_yes_no,
+    visited_to_idx
 )
 
-def assign_opening_date_category(year: Optional[float]) -> str:
+# Columns render_map_view reads. Every view mode shows the same tooltip, so
+# one projection serves all modes.
+MAP_COLUMNS = (
+    "SYSTEM_ID",
+    "LATITUDE",
+    "LONGITUDE",
+    "CITY",
+    "COUNTRY",
+    "VISITED",
+    "VISITED_IDX",
+    "OPENED_YEAR",
+    "YEAR_OPENED_GENERAL_FORMAT",
+    "LAST_MAJOR_UPDATE",
+    "NUMBER_OF_LINES",
+    "TOTAL_MILES",
+    "CURRENTLY_ACCESSIBLE",
+    "Currently accessible?",
+)
+
+
+# Map tooltip, built once at import, matching Plotly's default style (clean, minimal, white background)
+# Content matches the unified tooltip format; the per-row body is prerendered
+# into TOOLTIP_HTML by _build_map_payload
+# PyDeck uses {variable} syntax (single braces) for template variables
+# In f-strings, {{ becomes {, so {{TOOLTIP_HTML}} in code becomes {TOOLTIP_HTML} in output
+# Styling matches Plotly's default tooltip exactly: subtle border, minimal padding, no shadow
+_TOOLTIP_HTML = f"""
+<div style="padding: 10px; background-color: {TOOLTIP_BACKGROUND_COLOR}; color: {TOOLTIP_TEXT_COLOR}; border: 1px solid {TOOLTIP_BORDER_COLOR}; border-radius: 3px; font-family: "Open Sans", verdana, arial, sans-serif; font-size: 12px;">{{TOOLTIP_HTML}}</div>
+"""
+
+# Columns driving the size encodings, keyed by size_by
+_SIZE_COLUMNS = {"Lines": "NUMBER_OF_LINES", "Miles": "TOTAL_MILES"}
+
+# Radius range in meters for sized points (max increased by 1.5x)
+_SIZE_RANGE = (30000, 225000)
+
+# Bucket edges for the opening date encoding: years before 1985 are "pre-1985"
+_OPENING_DATE_BINS = np.array([1985])
+
+
+def _minmax(values: np.ndarray, low: float, high: float) -> Optional[np.ndarray]:
     """
-    Assign an opening date category (pre-1985 or 1985+).
+    Min-max scale values linearly onto [low, high].
     
     Args:
-        year: Year value (can be NaN/None)
+        values: Float array without NaNs
+        low: Output value for the minimum
+        high: Output value for the maximum
         
     Returns:
-        Category label string: "pre-1985", "1985+", or "unknown"
+        Scaled array, or None if all values are equal (nothing to scale)
     """
-    if pd.isna(year) or year is None:
-        return "unknown"
+    min_value, max_value = values.min(), values.max()
+    if max_value == min_value:
+        return None
     
-    year_int = int(year)
-    return "pre-1985" if year_int < 1985 else "1985+"
+    # One pass, with the ratio precomputed
+    scale = (high - low) / (max_value - min_value)
+    return (values - min_value) * scale + low
 
 
-def calculate_point_sizes(df: pd.DataFrame, size_by: str, base_size: int = 50000) -> List[float]:
+def calculate_point_sizes(
+    df: pd.DataFrame,
+    size_by: str,
+    base_size: int = 50000
+) -> Union[float, np.ndarray]:
     """
     Calculate point sizes for PyDeck based on the size encoding.
     
@@ -45,43 +96,23 @@ def calculate_point_sizes(df: pd.DataFrame, size_by: str, base_size: int = 50000
         base_size: Base radius in meters (used when size_by is "None")
         
     Returns:
-        List of radius values in meters
+        Array of radius values in meters, or a single radius when every
+        point has the same size
     """
-    if size_by == "None":
-        return [base_size] * len(df)
-    
-    elif size_by == "Lines":
-        if "NUMBER_OF_LINES" not in df.columns:
-            return [base_size] * len(df)
-        
-        # Normalize to a reasonable range (30000 to 225000 meters - max increased by 1.5x)
-        values = df["NUMBER_OF_LINES"].fillna(1)
-        min_size, max_size = 30000, 225000
-        
-        if values.max() == values.min():
-            return [base_size] * len(df)
-        
-        normalized = min_size + (values - values.min()) / (values.max() - values.min()) * (max_size - min_size)
-        return normalized.fillna(base_size).tolist()
+    column = _SIZE_COLUMNS.get(size_by)
+    if column is None or column not in df.columns:
+        return float(base_size)
     
-    elif size_by == "Miles":
-        if "TOTAL_MILES" not in df.columns:
-            return [base_size] * len(df)
-        
-        # Normalize to a reasonable range (30000 to 225000 meters - max increased by 1.5x)
-        values = df["TOTAL_MILES"].fillna(1)
-        min_size, max_size = 30000, 225000
-        
-        if values.max() == values.min():
-            return [base_size] * len(df)
-        
-        normalized = min_size + (values - values.min()) / (values.max() - values.min()) * (max_size - min_size)
-        return normalized.fillna(base_size).tolist()
-    
-    return [base_size] * len(df)
+    # Missing values count as 1; to_numpy copies when it has to fill them
+    values = df[column].to_numpy(dtype=np.float64, na_value=1.0)
+    sizes = _minmax(values, *_SIZE_RANGE)
+    return float(base_size) if sizes is None else sizes
 
 
-def calculate_point_colors(df: pd.DataFrame, color_by: str) -> List[List[int]]:
+def calculate_point_colors(
+    df: pd.DataFrame,
+    color_by: str
+) -> Union[Tuple[int, int, int, int], np.ndarray]:
     """
     Calculate point colors for PyDeck based on the color encoding.
     
@@ -90,43 +121,25 @@ def calculate_point_colors(df: pd.DataFrame, color_by: str) -> List[List[int]]:
         color_by: One of "None", "Visited", "Opening Date"
         
     Returns:
-        List of [R, G, B, A] color tuples
+        (N, 4) uint8 array of [R, G, B, A] colors, or a single color tuple
+        when every point has the same color
     """
-    if color_by == "None":
-        return [DEFAULT_POINT_COLOR] * len(df)
-    
-    elif color_by == "Visited":
-        if "VISITED" not in df.columns:
-            return [DEFAULT_POINT_COLOR] * len(df)
-        
-        colors = []
-        for visited_val in df["VISITED"]:
-            # Handle various formats: boolean, "yes"/"no", "true"/"false"
-            is_visited = None
-            if pd.isna(visited_val):
-                is_visited = None
-            elif isinstance(visited_val, bool):
-                is_visited = visited_val
-            elif isinstance(visited_val, str):
-                visited_lower = visited_val.lower().strip()
-                is_visited = visited_lower in ["yes", "true", "y", "1"]
-            
-            colors.append(VISITED_COLORS.get(is_visited, VISITED_COLORS[None]))
-        
-        return colors
+    if color_by == "Visited" and "VISITED" in df.columns:
+        # Use the precomputed palette index when the caller prepared one
+        if "VISITED_IDX" in df.columns:
+            visited_idx = df["VISITED_IDX"].to_numpy()
+        else:
+            visited_idx = visited_to_idx(df["VISITED"])
+        return VISITED_COLORS_ARR[visited_idx]
     
-    elif color_by == "Opening Date":
-        if "OPENED_YEAR" not in df.columns:
-            return [DEFAULT_POINT_COLOR] * len(df)
-        
-        colors = []
-        for year in df["OPENED_YEAR"]:
-            category = assign_opening_date_category(year)
-            colors.append(OPENING_DATE_COLORS.get(category, OPENING_DATE_COLORS["unknown"]))
-        
-        return colors
+    if color_by == "Opening Date" and "OPENED_YEAR" in df.columns:
+        # Bucket into OPENING_DATE_KEYS order: pre-1985, 1985+, unknown (NaN)
+        years = pd.to_numeric(df["OPENED_YEAR"], errors="coerce").to_numpy(dtype=float)
+        bucket_idx = np.searchsorted(_OPENING_DATE_BINS, years, side="right")
+        bucket_idx[np.isnan(years)] = 2
+        return OPENING_DATE_COLORS_ARR[bucket_idx]
     
-    return [DEFAULT_POINT_COLOR] * len(df)
+    return DEFAULT_POINT_COLOR
 
 
 def parse_view_mode(view_mode: str) -> Tuple[str, str]:
@@ -155,36 +168,6 @@ def parse_view_mode(view_mode: str) -> Tuple[str, str]:
         return ("None", "None")
 
 
-def _format_visited_status(visited_val) -> str:
-    """Format visited status for display."""
-    if pd.isna(visited_val):
-        return "Unknown"
-    elif isinstance(visited_val, bool):
-        return "Yes" if visited_val else "No"
-    elif isinstance(visited_val, str):
-        visited_lower = visited_val.lower().strip()
-        if visited_lower in ["yes", "true", "y", "1"]:
-            return "Yes"
-        elif visited_lower in ["no", "false", "n", "0"]:
-            return "No"
-    return "Unknown"
-
-
-def _format_accessible_status(accessible_val) -> str:
-    """Format currently accessible status for display."""
-    if pd.isna(accessible_val):
-        return "Unknown"
-    elif isinstance(accessible_val, bool):
-        return "Yes" if accessible_val else "No"
-    elif isinstance(accessible_val, str):
-        acc_lower = accessible_val.lower().strip()
-        if acc_lower in ["yes", "true", "y", "1"]:
-            return "Yes"
-        elif acc_lower in ["no", "false", "n", "0"]:
-            return "No"
-    return "Unknown"
-
-
 def _format_number(value, default="N/A") -> str:
     """Format a numeric value for display."""
     if pd.isna(value):
@@ -197,6 +180,39 @@ def _format_number(value, default="N/A") -> str:
         return default
 
 
+def _format_numbers(values: pd.Series, default: str = "N/A") -> np.ndarray:
+    """
+    Format a numeric column for display, dropping ".0" from whole floats.
+    
+    Args:
+        values: Column to format
+        default: Text for missing values
+        
+    Returns:
+        Array of display strings
+    """
+    dtype = values.dtype
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return values.to_numpy().astype(str).astype(object)
+    
+    if pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype):
+        numbers = values.to_numpy(dtype=np.float64)
+        finite = np.isfinite(numbers)
+        whole = finite & (numbers == np.floor(numbers))
+        formatted = numbers.astype(str).astype(object)
+        formatted[whole] = numbers[whole].astype(np.int64).astype(str)
+        formatted[np.isnan(numbers)] = default
+        return formatted
+    
+    # Mixed or text columns fall back to formatting value by value
+    return values.map(lambda value: _format_number(value, default)).to_numpy(dtype=object)
+
+
+def _format_text(values: pd.Series) -> np.ndarray:
+    """Format a text column for display."""
+    return values.map(str).to_numpy(dtype=object)
+
+
 def _render_color_legend(color_by: str):
     """
     Render a color legend for the current color encoding.
@@ -226,93 +242,126 @@ def _render_color_legend(color_by: str):
         st.markdown(f'<span style="color: {post_hex}">⬤</span> 1985+', unsafe_allow_html=True)
 
 
-def render_map_view(df: pd.DataFrame, view_mode: str = "Default") -> Optional[str]:
+@st.cache_data(show_spinner=False, max_entries=16)
+def _build_map_payload(
+    df: pd.DataFrame,
+    size_by: str,
+    color_by: str
+) -> Optional[Tuple[pd.DataFrame, dict, float, float]]:
     """
-    Render a PyDeck map with subway system points and handle click selection.
+    Build the PyDeck layer data and map center for one encoding.
+    
+    A pure function of the data and encodings, so it is cached: reruns that
+    don't change either reuse the payload instead of recomputing sizes,
+    colors and tooltip text. The Deck itself is built outside the cache.
     
     Args:
         df: DataFrame with subway system data including LATITUDE and LONGITUDE
-        view_mode: Selected view mode for map encoding
+        size_by: Size encoding from parse_view_mode
+        color_by: Color encoding from parse_view_mode
         
     Returns:
-        Selected system ID if a point was clicked, None otherwise
+        Tuple of (layer data, get_radius/get_color layer arguments, average
+        latitude, average longitude), or None if no row has coordinates
     """
-    # Filter out rows without coordinates
-    df_with_coords = df[
-        df["LATITUDE"].notna() & df["LONGITUDE"].notna()
-    ].copy()
+    # Filter out rows without coordinates, keeping only the columns the map reads
+    lat = df["LATITUDE"].to_numpy(dtype=np.float64, na_value=np.nan)
+    lon = df["LONGITUDE"].to_numpy(dtype=np.float64, na_value=np.nan)
+    has_coords = ~(np.isnan(lat) | np.isnan(lon))
+    df_with_coords = df.loc[has_coords, [col for col in MAP_COLUMNS if col in df.columns]]
     
     if df_with_coords.empty:
-        st.warning("No systems with valid coordinates to display on map.")
         return None
     
-    # Parse view mode to get size and color encodings
-    size_by, color_by = parse_view_mode(view_mode)
-    
     # Calculate dynamic sizes and colors
     point_sizes = calculate_point_sizes(df_with_coords, size_by)
     point_colors = calculate_point_colors(df_with_coords, color_by)
     
-    # Prepare data for PyDeck - add size, color, and tooltip data to each record
-    map_data = []
-    for i in range(len(df_with_coords)):
-        row = df_with_coords.iloc[i]
-        
-        # Format values for tooltip
-        city = str(row.get("CITY", "N/A"))
-        country = str(row.get("COUNTRY", "N/A"))
-        visited = _format_visited_status(row.get("VISITED"))
-        # Use OPENED_YEAR (which should be mapped from "Year opened (General Format)")
-        # or fallback to YEAR_OPENED_GENERAL_FORMAT if the column wasn't mapped
-        if "OPENED_YEAR" in df_with_coords.columns:
-            opened_year = _format_number(row.get("OPENED_YEAR"))
-        elif "YEAR_OPENED_GENERAL_FORMAT" in df_with_coords.columns:
-            opened_year = _format_number(row.get("YEAR_OPENED_GENERAL_FORMAT"))
-        else:
-            opened_year = "N/A"
-        last_update = _format_number(row.get("LAST_MAJOR_UPDATE"))
-        num_lines = _format_number(row.get("NUMBER_OF_LINES"))
-        total_miles = _format_number(row.get("TOTAL_MILES"))
-        
-        # Handle currently accessible column (may not exist)
-        currently_accessible = "Unknown"
-        if "CURRENTLY_ACCESSIBLE" in df_with_coords.columns:
-            currently_accessible = _format_accessible_status(row.get("CURRENTLY_ACCESSIBLE"))
-        elif "Currently accessible?" in df_with_coords.columns:
-            currently_accessible = _format_accessible_status(row.get("Currently accessible?"))
-        
-        record = {
-            "SYSTEM_ID": row["SYSTEM_ID"],
-            "LATITUDE": row["LATITUDE"],
-            "LONGITUDE": row["LONGITUDE"],
-            "CITY": city,
-            "COUNTRY": country,
-            "VISITED_DISPLAY": visited,
-            "OPENED_YEAR_DISPLAY": opened_year,
-            "LAST_UPDATE_DISPLAY": last_update,
-            "NUM_LINES_DISPLAY": num_lines,
-            "TOTAL_MILES_DISPLAY": total_miles,
-            "ACCESSIBLE_DISPLAY": currently_accessible,
-            "RADIUS": point_sizes[i],
-            "COLOR_R": point_colors[i][0],
-            "COLOR_G": point_colors[i][1],
-            "COLOR_B": point_colors[i][2],
-            "COLOR_A": point_colors[i][3],
-        }
-        map_data.append(record)
+    # Prepare data for PyDeck as columns: size, color, and tooltip text
+    columns = df_with_coords.columns
+    
+    def _display(column: str, formatter, default: str) -> np.ndarray:
+        if column not in columns:
+            return np.full(len(df_with_coords), default, dtype=object)
+        return formatter(df_with_coords[column])
+    
+    # Use OPENED_YEAR (which should be mapped from "Year opened (General Format)")
+    # or fallback to YEAR_OPENED_GENERAL_FORMAT if the column wasn't mapped
+    opened_year_column = "OPENED_YEAR" if "OPENED_YEAR" in columns else "YEAR_OPENED_GENERAL_FORMAT"
+    # Handle currently accessible column (may not exist)
+    accessible_column = "CURRENTLY_ACCESSIBLE" if "CURRENTLY_ACCESSIBLE" in columns else "Currently accessible?"
+    
+    # Render the tooltip body once per row here, so the layer ships a single
+    # text column and the browser template has one substitution
+    tooltip_html = (
+        '<div style="font-weight: bold; margin-bottom: 2px;">'
+        + _display("CITY", _format_text, "N/A") + ", "
+        + _display("COUNTRY", _format_text, "N/A") + "</div>"
+        + "<div>Visited: " + _display("VISITED", format_yes_no, "Unknown") + "</div>"
+        + "<div>Year Opened: " + _display(opened_year_column, _format_numbers, "N/A") + "</div>"
+        + "<div>Last Major Update: " + _display("LAST_MAJOR_UPDATE", _format_numbers, "N/A") + "</div>"
+        + "<div>Number of Lines: " + _display("NUMBER_OF_LINES", _format_numbers, "N/A") + "</div>"
+        + "<div>Total Length (mi): " + _display("TOTAL_MILES", _format_numbers, "N/A") + "</div>"
+        + "<div>Currently Accessible: " + _display(accessible_column, format_yes_no, "Unknown") + "</div>"
+    )
+    
+    map_data = pd.DataFrame({
+        "SYSTEM_ID": df_with_coords["SYSTEM_ID"],
+        "LATITUDE": df_with_coords["LATITUDE"],
+        "LONGITUDE": df_with_coords["LONGITUDE"],
+        "TOOLTIP_HTML": tooltip_html,
+    })
+    
+    # Constant sizes and colors go to the layer as literals instead of per-row columns
+    if isinstance(point_sizes, np.ndarray):
+        map_data["RADIUS"] = point_sizes
+        get_radius = "RADIUS"
+    else:
+        get_radius = point_sizes
+    if isinstance(point_colors, np.ndarray):
+        map_data[["COLOR_R", "COLOR_G", "COLOR_B", "COLOR_A"]] = point_colors
+        get_color = "[COLOR_R, COLOR_G, COLOR_B, COLOR_A]"
+    else:
+        get_color = list(point_colors)
+    layer_encodings = {"get_radius": get_radius, "get_color": get_color}
     
     # Calculate initial view state (center on data)
-    avg_lat = df_with_coords["LATITUDE"].mean()
-    avg_lon = df_with_coords["LONGITUDE"].mean()
+    avg_lat = float(lat[has_coords].mean())
+    avg_lon = float(lon[has_coords].mean())
+    
+    return map_data, layer_encodings, avg_lat, avg_lon
+
+
+def render_map_view(df: pd.DataFrame, view_mode: str = "Default") -> Optional[str]:
+    """
+    Render a PyDeck map with subway system points and handle click selection.
+    
+    Args:
+        df: DataFrame with subway system data including LATITUDE and LONGITUDE
+        view_mode: Selected view mode for map encoding
+        
+    Returns:
+        Selected system ID if a point was clicked, None otherwise
+    """
+    # Imported here so pydeck is only loaded once a map is actually drawn
+    import pydeck as pdk
+    
+    # Parse view mode to get size and color encodings
+    size_by, color_by = parse_view_mode(view_mode)
+    
+    payload = _build_map_payload(df, size_by, color_by)
+    if payload is None:
+        st.warning("No systems with valid coordinates to display on map.")
+        return None
+    map_data, layer_encodings, avg_lat, avg_lon = payload
     
     # Create PyDeck layer with dynamic properties
     layer = pdk.Layer(
         "ScatterplotLayer",
         data=map_data,
         get_position=["LONGITUDE", "LATITUDE"],
-        get_color="[COLOR_R, COLOR_G, COLOR_B, COLOR_A]",
-        get_radius="RADIUS",
         pickable=True,  # Enable click selection
+        **layer_encodings
     )
     
     # Create view state
@@ -324,29 +373,12 @@ def render_map_view(df: pd.DataFrame, view_mode: str = "Default") -> Optional[st
         bearing=0
     )
     
-    # Create tooltip matching Plotly's default style (clean, minimal, white background)
-    # Content matches the unified tooltip format
-    # PyDeck uses {variable} syntax (single braces) for template variables
-    # In f-strings, {{ becomes {, so {{CITY}} in code becomes {CITY} in output
-    # Styling matches Plotly's default tooltip exactly: subtle border, minimal padding, no shadow
-    tooltip_html = f"""
-    <div style="padding: 10px; background-color: {TOOLTIP_BACKGROUND_COLOR}; color: {TOOLTIP_TEXT_COLOR}; border: 1px solid {TOOLTIP_BORDER_COLOR}; border-radius: 3px; font-family: "Open Sans", verdana, arial, sans-serif; font-size: 12px;">
-        <div style="font-weight: bold; margin-bottom: 2px;">{{CITY}}, {{COUNTRY}}</div>
-        <div>Visited: {{VISITED_DISPLAY}}</div>
-        <div>Year Opened: {{OPENED_YEAR_DISPLAY}}</div>
-        <div>Last Major Update: {{LAST_UPDATE_DISPLAY}}</div>
-        <div>Number of Lines: {{NUM_LINES_DISPLAY}}</div>
-        <div>Total Length (mi): {{TOTAL_MILES_DISPLAY}}</div>
-        <div>Currently Accessible: {{ACCESSIBLE_DISPLAY}}</div>
-    </div>
-    """
-    
     # Create deck
     deck = pdk.Deck(
         map_style="light",  # Light theme to match app
         initial_view_state=view_state,
         layers=[layer],
-        tooltip={"html": tooltip_html}
+        tooltip={"html": _TOOLTIP_HTML}
     )
     
     # Render map
@@ -4,10 +4,10 @@ Plots module for subway system visualizations using Plotly.
 Creates scatter plots with click selection to set selected_system_id.
 """
 
+import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.express as px
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from src.colors import (
     PLOTLY_BACKGROUND_COLOR,
@@ -16,38 +16,23 @@ from src.colors import (
     PLOTLY_GRID_COLOR,
     PLOTLY_LINE_COLOR,
     PLOTLY_MARKER_COLOR,
-    PLOTLY_MARKER_COLOR_SEQUENCE
+    format_yes_no
 )
+from src.state import get_data_version
 
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
-def _format_visited_status(visited_val) -> str:
-    """Format visited status for display."""
-    if pd.isna(visited_val):
-        return "Unknown"
-    elif isinstance(visited_val, bool):
-        return "Yes" if visited_val else "No"
-    elif isinstance(visited_val, str):
-        visited_lower = visited_val.lower().strip()
-        if visited_lower in ["yes", "true", "y", "1"]:
-            return "Yes"
-        elif visited_lower in ["no", "false", "n", "0"]:
-            return "No"
-    return "Unknown"
-
-
-def _format_accessible_status(accessible_val) -> str:
-    """Format currently accessible status for display."""
-    if pd.isna(accessible_val):
-        return "Unknown"
-    elif isinstance(accessible_val, bool):
-        return "Yes" if accessible_val else "No"
-    elif isinstance(accessible_val, str):
-        acc_lower = accessible_val.lower().strip()
-        if acc_lower in ["yes", "true", "y", "1"]:
-            return "Yes"
-        elif acc_lower in ["no", "false", "n", "0"]:
-            return "No"
-    return "Unknown"
+
+# Formatted tooltip columns, in hovertemplate order after CITY and COUNTRY
+_TOOLTIP_DISPLAY_COLUMNS = (
+    "VISITED_DISPLAY",
+    "OPENED_YEAR_DISPLAY",
+    "LAST_UPDATE_DISPLAY",
+    "NUM_LINES_DISPLAY",
+    "TOTAL_MILES_DISPLAY",
+    "ACCESSIBLE_DISPLAY",
+)
 
 
 def _format_number(value, default="N/A") -> str:
@@ -62,6 +47,63 @@ def _format_number(value, default="N/A") -> str:
         return default
 
 
+def _has_values(df: pd.DataFrame, *columns: str) -> np.ndarray:
+    """
+    Boolean mask of rows where every given numeric column has a value.
+    
+    Args:
+        df: DataFrame with subway system data
+        *columns: Numeric columns that must be present
+        
+    Returns:
+        Boolean NumPy array, one entry per row
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for col in columns:
+        mask &= ~np.isnan(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+    return mask
+
+
+def _format_yes_no(values: pd.Series) -> pd.Series:
+    """
+    Format a yes/no style column for display, keeping its index.
+    
+    Args:
+        values: Column to format
+        
+    Returns:
+        Series of "Yes", "No" or "Unknown"
+    """
+    return pd.Series(format_yes_no(values), index=values.index, dtype=object)
+
+
+def _format_numbers(values: pd.Series, default: str = "N/A") -> pd.Series:
+    """
+    Format a numeric column for display, dropping ".0" from whole floats.
+    
+    Args:
+        values: Column to format
+        default: Text for missing values
+        
+    Returns:
+        Series of display strings
+    """
+    dtype = values.dtype
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return values.astype(str).astype(object)
+    
+    if pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype):
+        numbers = values.to_numpy()
+        whole = np.isfinite(numbers) & (numbers == np.floor(numbers))
+        formatted = numbers.astype(str).astype(object)
+        formatted[whole] = numbers[whole].astype(np.int64).astype(str)
+        formatted[np.isnan(numbers)] = default
+        return pd.Series(formatted, index=values.index)
+    
+    # Mixed or text columns fall back to formatting value by value
+    return values.map(lambda value: _format_number(value, default)).astype(object)
+
+
 def _create_tooltip_hovertemplate() -> str:
     """
     Create a unified Plotly hovertemplate that matches the map tooltip content.
@@ -82,93 +124,123 @@ def _prepare_tooltip_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Prepare DataFrame with formatted tooltip data columns.
     
+    The input is only read; the formatted columns go into a new frame on the
+    same index instead of a copy of the whole table.
+    
     Args:
         df: DataFrame with subway system data
         
     Returns:
-        DataFrame with additional formatted tooltip columns
+        DataFrame with only the formatted tooltip columns
     """
-    plot_df = df.copy()
+    display_df = pd.DataFrame(index=df.index)
+    # Missing columns map to an empty Series, which aligns to NaN like before
+    empty = pd.Series(dtype=object)
     
     # Format visited status
-    plot_df["VISITED_DISPLAY"] = plot_df.get("VISITED", pd.Series()).apply(_format_visited_status)
+    display_df["VISITED_DISPLAY"] = _format_yes_no(df.get("VISITED", empty))
     
     # Format opened year
-    if "OPENED_YEAR" in plot_df.columns:
-        plot_df["OPENED_YEAR_DISPLAY"] = plot_df["OPENED_YEAR"].apply(_format_number)
-    elif "YEAR_OPENED_GENERAL_FORMAT" in plot_df.columns:
-        plot_df["OPENED_YEAR_DISPLAY"] = plot_df["YEAR_OPENED_GENERAL_FORMAT"].apply(_format_number)
+    if "OPENED_YEAR" in df.columns:
+        display_df["OPENED_YEAR_DISPLAY"] = _format_numbers(df["OPENED_YEAR"])
+    elif "YEAR_OPENED_GENERAL_FORMAT" in df.columns:
+        display_df["OPENED_YEAR_DISPLAY"] = _format_numbers(df["YEAR_OPENED_GENERAL_FORMAT"])
     else:
-        plot_df["OPENED_YEAR_DISPLAY"] = "N/A"
+        display_df["OPENED_YEAR_DISPLAY"] = "N/A"
     
     # Format last update
-    plot_df["LAST_UPDATE_DISPLAY"] = plot_df.get("LAST_MAJOR_UPDATE", pd.Series()).apply(_format_number)
+    display_df["LAST_UPDATE_DISPLAY"] = _format_numbers(df.get("LAST_MAJOR_UPDATE", empty))
     
     # Format number of lines
-    plot_df["NUM_LINES_DISPLAY"] = plot_df.get("NUMBER_OF_LINES", pd.Series()).apply(_format_number)
+    display_df["NUM_LINES_DISPLAY"] = _format_numbers(df.get("NUMBER_OF_LINES", empty))
     
     # Format total miles
-    plot_df["TOTAL_MILES_DISPLAY"] = plot_df.get("TOTAL_MILES", pd.Series()).apply(_format_number)
+    display_df["TOTAL_MILES_DISPLAY"] = _format_numbers(df.get("TOTAL_MILES", empty))
     
     # Format currently accessible
-    if "CURRENTLY_ACCESSIBLE" in plot_df.columns:
-        plot_df["ACCESSIBLE_DISPLAY"] = plot_df["CURRENTLY_ACCESSIBLE"].apply(_format_accessible_status)
-    elif "Currently accessible?" in plot_df.columns:
-        plot_df["ACCESSIBLE_DISPLAY"] = plot_df["Currently accessible?"].apply(_format_accessible_status)
+    if "CURRENTLY_ACCESSIBLE" in df.columns:
+        display_df["ACCESSIBLE_DISPLAY"] = _format_yes_no(df["CURRENTLY_ACCESSIBLE"])
+    elif "Currently accessible?" in df.columns:
+        display_df["ACCESSIBLE_DISPLAY"] = _format_yes_no(df["Currently accessible?"])
     else:
-        plot_df["ACCESSIBLE_DISPLAY"] = "Unknown"
+        display_df["ACCESSIBLE_DISPLAY"] = "Unknown"
     
-    return plot_df
+    # Few distinct labels per column, so store codes plus one copy of each label
+    return display_df.astype("category")
 
 
-def create_lines_vs_miles_plot(df: pd.DataFrame) -> Optional[str]:
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _tooltip_frame(_df: pd.DataFrame, data_version: str) -> pd.DataFrame:
     """
-    Create a scatter plot of lines vs miles with click selection.
+    Format the tooltip columns once per data version.
+    
+    Both plots filter rows from this frame, so clicks and other reruns skip
+    tooltip formatting entirely. The dataframe argument is not hashed
+    (leading underscore), data_version is the cache key. Callers must treat
+    the result as read-only.
     
     Args:
-        df: DataFrame with subway system data
+        _df: DataFrame with subway system data
+        data_version: Version identifier of the data
         
     Returns:
-        Selected system ID if a point was clicked, None otherwise
+        DataFrame with the formatted tooltip columns
     """
-    # Filter to rows with both columns
-    plot_df = df[
-        df["NUMBER_OF_LINES"].notna() & df["TOTAL_MILES"].notna()
-    ].copy()
+    return _prepare_tooltip_data(_df)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _build_scatter_figure(
+    _plot_df: pd.DataFrame,
+    _tooltips: pd.DataFrame,
+    data_version: str,
+    x: str,
+    y: str,
+    labels: dict,
+    title: str
+) -> "go.Figure":
+    """
+    Build a styled scatter plot with the unified tooltip.
     
-    if plot_df.empty:
-        st.warning("No data available for lines vs miles plot.")
-        return None
+    Cached on the data version and plot settings, so reruns only re-send the
+    figure instead of rebuilding it. Callers must not modify the figure.
     
-    # Prepare tooltip data
-    plot_df = _prepare_tooltip_data(plot_df)
-    
-    # Prepare customdata for hovertemplate (order matches _create_tooltip_hovertemplate)
-    # Plotly expects custom_data as a list of arrays, where each array is one custom data field
-    # So we transpose: each column becomes an array, all arrays have same length (number of rows)
-    custom_data_cols = [
-        plot_df["CITY"].tolist(),
-        plot_df["COUNTRY"].tolist(),
-        plot_df["VISITED_DISPLAY"].tolist(),
-        plot_df["OPENED_YEAR_DISPLAY"].tolist(),
-        plot_df["LAST_UPDATE_DISPLAY"].tolist(),
-        plot_df["NUM_LINES_DISPLAY"].tolist(),
-        plot_df["TOTAL_MILES_DISPLAY"].tolist(),
-        plot_df["ACCESSIBLE_DISPLAY"].tolist(),
-    ]
-    
-    # Create scatter plot
-    fig = px.scatter(
-        plot_df,
-        x="TOTAL_MILES",
-        y="NUMBER_OF_LINES",
-        custom_data=custom_data_cols,
-        labels={
-            "TOTAL_MILES": "Total Miles",
-            "NUMBER_OF_LINES": "Number of Lines"
-        },
-        title="Lines vs Miles",
-        color_discrete_sequence=PLOTLY_MARKER_COLOR_SEQUENCE
+    Args:
+        _plot_df: Rows to plot (not hashed; the rows follow from
+            data_version and the x/y columns)
+        _tooltips: Formatted tooltip columns for the same rows (not hashed)
+        data_version: Version identifier of the data
+        x: Column for the x axis
+        y: Column for the y axis
+        labels: Axis labels keyed by column
+        title: Plot title
+        
+    Returns:
+        Plotly figure
+    """
+    # Imported here so plotly is only loaded once a plot is actually drawn
+    import plotly.graph_objects as go
+    
+    # Prepare customdata for hovertemplate (order matches _create_tooltip_hovertemplate):
+    # one row per point, one column per tooltip field, converted in two block copies
+    customdata = np.hstack([
+        _plot_df[["CITY", "COUNTRY"]].to_numpy(dtype=object),
+        _tooltips[list(_TOOLTIP_DISPLAY_COLUMNS)].to_numpy(dtype=object),
+    ])
+    
+    # Create scatter plot; Scattergl draws with WebGL, which stays fast for many points
+    fig = go.Figure(
+        go.Scattergl(
+            x=_plot_df[x].to_numpy(),
+            y=_plot_df[y].to_numpy(),
+            mode="markers",
+            customdata=customdata
+        )
+    )
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y)
     )
     
     # Update layout for dark theme
@@ -186,117 +258,62 @@ def create_lines_vs_miles_plot(df: pd.DataFrame) -> Optional[str]:
         hovertemplate=_create_tooltip_hovertemplate()
     )
     
-    # Render plot
-    event = st.plotly_chart(
-        fig,
-        use_container_width=True,
-        on_select="rerun",
-        key="lines_miles_plot"
-    )
-    
-    # Handle selection - Streamlit returns selection data in event
-    if event and "selection" in event:
-        selection = event["selection"]
-        if selection and "points" in selection and len(selection["points"]) > 0:
-            # Get the first selected point index
-            point_idx = selection["points"][0].get("point_index", None)
-            if point_idx is not None and point_idx < len(plot_df):
-                selected_system_id = plot_df.iloc[point_idx]["SYSTEM_ID"]
-                return selected_system_id
-    
-    # Fallback: show clickable dataframe for selection
-    st.markdown("**Or select a system from the list below:**")
-    selection_df = plot_df[["SYSTEM_ID", "CITY", "COUNTRY", "NUMBER_OF_LINES", "TOTAL_MILES"]].copy()
-    selection_df.index = range(len(selection_df))
-    
-    selected_rows = st.dataframe(
-        selection_df,
-        use_container_width=True,
-        hide_index=True,
-        on_select="rerun",
-        selection_mode="single-row",
-        key="lines_miles_selection"
-    )
-    
-    if selected_rows.selection.rows:
-        selected_idx = selected_rows.selection.rows[0]
-        selected_system_id = selection_df.iloc[selected_idx]["SYSTEM_ID"]
-        return selected_system_id
-    
-    return None
+    return fig
 
 
-def create_ridership_vs_population_plot(df: pd.DataFrame) -> Optional[str]:
+def _scatter_with_selection(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    labels: dict,
+    title: str,
+    plot_name: str,
+    key_prefix: str
+) -> Optional[str]:
     """
-    Create a scatter plot of annual ridership vs city population with click selection.
+    Render a scatter plot of y vs x with click selection and a selectable list.
     
     Args:
         df: DataFrame with subway system data
+        x: Column for the x axis
+        y: Column for the y axis
+        labels: Axis labels keyed by column
+        title: Plot title
+        plot_name: Short name used in the "no data" warning
+        key_prefix: Prefix for the plot and list widget keys
         
     Returns:
-        Selected system ID if a point was clicked, None otherwise
+        Selected system ID if a point or row was selected, None otherwise
     """
-    # Filter to rows with both columns
-    plot_df = df[
-        df["ANNUAL_RIDERSHIP"].notna() & df["CITY_POPULATION"].notna()
-    ].copy()
+    # Filter to rows with both columns, keeping only the columns read below
+    has_values = _has_values(df, y, x)
+    plot_df = df.loc[has_values, ["SYSTEM_ID", "CITY", "COUNTRY", y, x]]
     
     if plot_df.empty:
-        st.warning("No data available for ridership vs population plot.")
+        st.warning(f"No data available for {plot_name} plot.")
         return None
     
-    # Prepare tooltip data
-    plot_df = _prepare_tooltip_data(plot_df)
-    
-    # Prepare customdata for hovertemplate (order matches _create_tooltip_hovertemplate)
-    # Plotly expects custom_data as a list of arrays, where each array is one custom data field
-    # So we transpose: each column becomes an array, all arrays have same length (number of rows)
-    custom_data_cols = [
-        plot_df["CITY"].tolist(),
-        plot_df["COUNTRY"].tolist(),
-        plot_df["VISITED_DISPLAY"].tolist(),
-        plot_df["OPENED_YEAR_DISPLAY"].tolist(),
-        plot_df["LAST_UPDATE_DISPLAY"].tolist(),
-        plot_df["NUM_LINES_DISPLAY"].tolist(),
-        plot_df["TOTAL_MILES_DISPLAY"].tolist(),
-        plot_df["ACCESSIBLE_DISPLAY"].tolist(),
-    ]
-    
-    # Create scatter plot
-    fig = px.scatter(
+    # Build the figure once per data version; tooltip columns come preformatted
+    data_version = get_data_version()
+    fig = _build_scatter_figure(
         plot_df,
-        x="CITY_POPULATION",
-        y="ANNUAL_RIDERSHIP",
-        custom_data=custom_data_cols,
-        labels={
-            "CITY_POPULATION": "City Population",
-            "ANNUAL_RIDERSHIP": "Annual Ridership"
-        },
-        title="Annual Ridership vs City Population",
-        color_discrete_sequence=PLOTLY_MARKER_COLOR_SEQUENCE
-    )
-    
-    # Update layout for dark theme
-    fig.update_layout(
-        plot_bgcolor=PLOTLY_BACKGROUND_COLOR,
-        paper_bgcolor=PLOTLY_PAPER_COLOR,
-        font_color=PLOTLY_FONT_COLOR,
-        xaxis=dict(gridcolor=PLOTLY_GRID_COLOR, linecolor=PLOTLY_LINE_COLOR),
-        yaxis=dict(gridcolor=PLOTLY_GRID_COLOR, linecolor=PLOTLY_LINE_COLOR)
+        _tooltip_frame(df, data_version).loc[has_values],
+        data_version,
+        x,
+        y,
+        labels,
+        title
     )
     
-    # Update marker color and tooltip
-    fig.update_traces(
-        marker=dict(color=PLOTLY_MARKER_COLOR, size=8),
-        hovertemplate=_create_tooltip_hovertemplate()
-    )
+    # Selections report row positions; read IDs from the array, not per-row Series
+    system_ids = plot_df["SYSTEM_ID"].to_numpy()
     
     # Render plot
     event = st.plotly_chart(
         fig,
         use_container_width=True,
         on_select="rerun",
-        key="ridership_population_plot"
+        key=f"{key_prefix}_plot"
     )
     
     # Handle selection - Streamlit returns selection data in event
@@ -305,32 +322,76 @@ def create_ridership_vs_population_plot(df: pd.DataFrame) -> Optional[str]:
         if selection and "points" in selection and len(selection["points"]) > 0:
             # Get the first selected point index
             point_idx = selection["points"][0].get("point_index", None)
-            if point_idx is not None and point_idx < len(plot_df):
-                selected_system_id = plot_df.iloc[point_idx]["SYSTEM_ID"]
-                return selected_system_id
+            if point_idx is not None and point_idx < len(system_ids):
+                return system_ids[point_idx]
     
     # Fallback: show clickable dataframe for selection
     st.markdown("**Or select a system from the list below:**")
-    selection_df = plot_df[["SYSTEM_ID", "CITY", "COUNTRY", "ANNUAL_RIDERSHIP", "CITY_POPULATION"]].copy()
-    selection_df.index = range(len(selection_df))
     
+    # plot_df already holds just the listed columns, in display order
     selected_rows = st.dataframe(
-        selection_df,
+        plot_df,
         use_container_width=True,
         hide_index=True,
         on_select="rerun",
         selection_mode="single-row",
-        key="ridership_population_selection"
+        key=f"{key_prefix}_selection"
     )
     
     if selected_rows.selection.rows:
-        selected_idx = selected_rows.selection.rows[0]
-        selected_system_id = selection_df.iloc[selected_idx]["SYSTEM_ID"]
-        return selected_system_id
+        return system_ids[selected_rows.selection.rows[0]]
     
     return None
 
 
+def create_lines_vs_miles_plot(df: pd.DataFrame) -> Optional[str]:
+    """
+    Create a scatter plot of lines vs miles with click selection.
+    
+    Args:
+        df: DataFrame with subway system data
+        
+    Returns:
+        Selected system ID if a point was clicked, None otherwise
+    """
+    return _scatter_with_selection(
+        df,
+        "TOTAL_MILES",
+        "NUMBER_OF_LINES",
+        {
+            "TOTAL_MILES": "Total Miles",
+            "NUMBER_OF_LINES": "Number of Lines"
+        },
+        "Lines vs Miles",
+        "lines vs miles",
+        "lines_miles"
+    )
+
+
+def create_ridership_vs_population_plot(df: pd.DataFrame) -> Optional[str]:
+    """
+    Create a scatter plot of annual ridership vs city population with click selection.
+    
+    Args:
+        df: DataFrame with subway system data
+        
+    Returns:
+        Selected system ID if a point was clicked, None otherwise
+    """
+    return _scatter_with_selection(
+        df,
+        "CITY_POPULATION",
+        "ANNUAL_RIDERSHIP",
+        {
+            "CITY_POPULATION": "City Population",
+            "ANNUAL_RIDERSHIP": "Annual Ridership"
+        },
+        "Annual Ridership vs City Population",
+        "ridership vs population",
+        "ridership_population"
+    )
+
+
 def render_plots_tab(df: pd.DataFrame) -> Optional[str]:
     """
     Render the plots tab with multiple scatter plot options.
@@ -345,16 +406,20 @@ def render_plots_tab(df: pd.DataFrame) -> Optional[str]:
         st.warning("No data available. Please upload data in the Ingest tab.")
         return None
     
-    # Create sub-tabs for different plots
-    tab1, tab2 = st.tabs(["Lines vs Miles", "Ridership vs Population"])
-    
-    selected_system_id = None
-    
-    with tab1:
-        selected_system_id = create_lines_vs_miles_plot(df)
-    
-    with tab2:
-        if not selected_system_id:  # Only check second tab if first didn't select
-            selected_system_id = create_ridership_vs_population_plot(df)
+    # Only the chosen plot is built; st.tabs would run both on every rerun
+    plot_name = st.radio(
+        "Plot",
+        options=tuple(_PLOTS),
+        horizontal=True,
+        key="active_plot",
+        label_visibility="collapsed"
+    )
     
-    return selected_system_id
+    return _PLOTS[plot_name](df)
+
+
+# Plots offered in the Plots tab, in display order
+_PLOTS = {
+    "Lines vs Miles": create_lines_vs_miles_plot,
+    "Ridership vs Population": create_ridership_vs_population_plot,
+}
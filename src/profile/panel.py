@@ -4,10 +4,57 @@ Profile panel component for displaying selected subway system information.
 Shows "Selected: <SYSTEM_ID>" and row fields from the dataframe.
 """
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 from typing import Optional
 
+from src.state import get_data_version
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _system_id_index(_df: pd.DataFrame, data_version: str) -> pd.Index:
+    """
+    Build a hashed SYSTEM_ID index once per data version.
+    
+    The dataframe argument is not hashed (leading underscore), data_version
+    is the cache key.
+    
+    Args:
+        _df: DataFrame with subway system data
+        data_version: Version identifier of the data
+        
+    Returns:
+        Index of the SYSTEM_ID column, in row order
+    """
+    return pd.Index(_df["SYSTEM_ID"])
+
+
+def _find_system_position(df: pd.DataFrame, system_id: str) -> Optional[int]:
+    """
+    Find the row position of a system with a hash lookup instead of a column scan.
+    
+    Args:
+        df: DataFrame with subway system data
+        system_id: System ID to look up
+        
+    Returns:
+        Position of the first row with this SYSTEM_ID, or None if not found
+    """
+    index = _system_id_index(df, get_data_version())
+    
+    try:
+        loc = index.get_loc(system_id)
+    except (KeyError, TypeError):
+        return None
+    
+    # Duplicate IDs give a slice or mask; use the first match like before
+    if isinstance(loc, slice):
+        return loc.start
+    if isinstance(loc, np.ndarray):
+        return int(loc.argmax())
+    return loc
+
 
 def render_profile_panel(df: pd.DataFrame, system_id: Optional[str]) -> None:
     """
@@ -22,14 +69,13 @@ def render_profile_panel(df: pd.DataFrame, system_id: Optional[str]) -> None:
         return
     
     # Find the row for this system
-    system_row = df[df["SYSTEM_ID"] == system_id]
+    position = _find_system_position(df, system_id)
     
-    if system_row.empty:
+    if position is None:
         st.warning(f"System ID '{system_id}' not found in data.")
         return
     
-    # Get the first (and should be only) row
-    row = system_row.iloc[0]
+    row = df.iloc[position]
     
     # Display header
     st.header(f"Selected: {system_id}")
@@ -37,22 +83,12 @@ def render_profile_panel(df: pd.DataFrame, system_id: Optional[str]) -> None:
     # Display all row fields
     st.subheader("System Details")
     
-    # Create a dictionary of all fields (excluding index)
-    system_data = {}
-    for col in df.columns:
-        value = row[col]
-        # Format the value nicely
-        if pd.isna(value):
-            system_data[col] = "N/A"
-        elif isinstance(value, (int, float)):
-            system_data[col] = value
-        else:
-            system_data[col] = str(value)
-    
-    # Display as a dataframe for clean formatting
+    # Format every field in one pass: missing values become "N/A", the rest
+    # text (st.dataframe would stringify the mixed-type column anyway)
+    values = row.astype(object)
     display_df = pd.DataFrame({
-        "Field": system_data.keys(),
-        "Value": system_data.values()
+        "Field": row.index,
+        "Value": values.where(values.notna(), "N/A").astype(str).to_numpy()
     })
     
     st.dataframe(
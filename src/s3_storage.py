@@ -1,7 +1,9 @@
 """
 S3 storage utilities for persisting preprocessed tables.
 
-Handles uploading and downloading preprocessed DataFrames to/from S3 as CSV files.
+Handles uploading and downloading preprocessed DataFrames to/from S3 as
+zstd-compressed Parquet files (gzipped CSV for tables Parquet cannot encode;
+plain CSV objects written by older versions still load).
 Uses Streamlit secrets for AWS credentials configuration.
 """
 
@@ -12,6 +14,33 @@ from botocore.exceptions import ClientError, NoCredentialsError
 from io import BytesIO
 from typing import Optional, Tuple
 
+# Content types stored on the S3 object; load_table_from_s3 picks the reader from it
+_PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+_CSV_CONTENT_TYPE = "text/csv"
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _create_s3_client(access_key_id: str, secret_access_key: str):
+    """
+    Create an S3 client once per set of credentials.
+    
+    boto3 clients are thread-safe and slow to build (service model loading,
+    endpoint resolution), so one client is shared by all sessions. Rotated
+    credentials are a new cache key and get a new client.
+    
+    Args:
+        access_key_id: AWS access key ID
+        secret_access_key: AWS secret access key
+        
+    Returns:
+        boto3 S3 client
+    """
+    return boto3.client(
+        's3',
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key
+    )
+
 
 def get_s3_client():
     """
@@ -24,10 +53,9 @@ def get_s3_client():
         ValueError: If AWS credentials are missing from Streamlit secrets
     """
     try:
-        return boto3.client(
-            's3',
-            aws_access_key_id=st.secrets["aws"]["access_key_id"],
-            aws_secret_access_key=st.secrets["aws"]["secret_access_key"]
+        return _create_s3_client(
+            st.secrets["aws"]["access_key_id"],
+            st.secrets["aws"]["secret_access_key"]
         )
     except KeyError as e:
         raise ValueError(f"Missing AWS credentials in Streamlit secrets: {e}")
@@ -51,30 +79,62 @@ def get_s3_config() -> Tuple[str, str]:
         raise ValueError(f"Missing S3 configuration in Streamlit secrets: {e}")
 
 
-def check_s3_table_exists() -> bool:
+def head_s3_table(bucket_name: str, s3_key: str) -> Optional[str]:
     """
-    Check if preprocessed table exists in S3.
+    Get the ETag of an S3 object, raising on anything but a missing object.
     
+    Args:
+        bucket_name: S3 bucket holding the object
+        s3_key: S3 key of the object
+        
     Returns:
-        True if table exists, False otherwise
+        ETag string if the object exists, None if S3 answers 404
+        
+    Raises:
+        ClientError: For S3 errors other than 404 (permissions, throttling, etc.)
+        ValueError: If AWS credentials are missing from Streamlit secrets
     """
     try:
-        s3_client = get_s3_client()
-        bucket_name, s3_key = get_s3_config()
-        s3_client.head_object(Bucket=bucket_name, Key=s3_key)
-        return True
+        response = get_s3_client().head_object(Bucket=bucket_name, Key=s3_key)
     except ClientError as e:
         if e.response['Error']['Code'] == '404':
-            return False
+            return None
+        raise
+    return response.get('ETag')
+
+
+def get_s3_table_etag() -> Optional[str]:
+    """
+    Get the ETag of the preprocessed table in S3.
+    
+    The ETag changes whenever the object is replaced, so it can be used as a
+    cheap cache key for the table contents.
+    
+    Returns:
+        ETag string if table exists, None otherwise
+    """
+    try:
+        return head_s3_table(*get_s3_config())
+    except ClientError as e:
         # Re-raise other client errors (permissions, etc.)
         st.error(f"S3 error checking for table: {str(e)}")
-        return False
+        return None
     except ValueError:
-        # Missing credentials/config - return False gracefully
-        return False
+        # Missing credentials/config - return None gracefully
+        return None
     except Exception as e:
         st.warning(f"Unexpected error checking S3: {str(e)}")
-        return False
+        return None
+
+
+def check_s3_table_exists() -> bool:
+    """
+    Check if preprocessed table exists in S3.
+    
+    Returns:
+        True if table exists, False otherwise
+    """
+    return get_s3_table_etag() is not None
 
 
 def load_table_from_s3() -> Optional[pd.DataFrame]:
@@ -89,9 +149,19 @@ def load_table_from_s3() -> Optional[pd.DataFrame]:
         bucket_name, s3_key = get_s3_config()
         
         response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
-        csv_bytes = response['Body'].read()
         
-        df = pd.read_csv(BytesIO(csv_bytes))
+        body = response['Body']
+        try:
+            if response.get('ContentType') == _PARQUET_CONTENT_TYPE:
+                # Parquet needs random access to its footer, so buffer the object
+                df = pd.read_parquet(BytesIO(body.read()), engine="pyarrow")
+            else:
+                # Parse CSV straight from the HTTP stream so the whole object is
+                # never held in memory as one bytes blob before parsing
+                gzipped = response.get('ContentEncoding') == "gzip"
+                df = pd.read_csv(body, compression="gzip" if gzipped else None)
+        finally:
+            body.close()
         return df
     except ValueError as e:
         # Missing credentials/config
@@ -111,7 +181,7 @@ def load_table_from_s3() -> Optional[pd.DataFrame]:
 
 def save_table_to_s3(df: pd.DataFrame) -> bool:
     """
-    Save DataFrame to S3 as CSV, replacing existing if present.
+    Save DataFrame to S3 as Parquet (or CSV), replacing existing if present.
     
     Args:
         df: DataFrame to save
@@ -123,17 +193,27 @@ def save_table_to_s3(df: pd.DataFrame) -> bool:
         s3_client = get_s3_client()
         bucket_name, s3_key = get_s3_config()
         
-        # Convert DataFrame to CSV bytes
-        csv_buffer = BytesIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_buffer.seek(0)
+        # Parquet keeps column types and is far smaller than CSV. pyarrow
+        # rejects object columns with mixed types; those tables go as CSV.
+        buffer = BytesIO()
+        extra_args = {}
+        try:
+            df.to_parquet(buffer, engine="pyarrow", compression="zstd", index=False)
+            content_type = _PARQUET_CONTENT_TYPE
+        except (ImportError, TypeError, ValueError):
+            # CSV text compresses well; gzip keeps it readable by any client
+            buffer = BytesIO()
+            df.to_csv(buffer, index=False, compression={"method": "gzip", "compresslevel": 3})
+            content_type = _CSV_CONTENT_TYPE
+            extra_args["ContentEncoding"] = "gzip"
         
         # Upload to S3 (this replaces existing file if it exists)
         s3_client.put_object(
             Bucket=bucket_name,
             Key=s3_key,
-            Body=csv_buffer.getvalue(),
-            ContentType='text/csv'
+            Body=buffer.getvalue(),
+            ContentType=content_type,
+            **extra_args
         )
         return True
     except ValueError as e:
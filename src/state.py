@@ -6,7 +6,9 @@ including df_core, data_version, and selected_system_id.
 """
 
 import hashlib
+import pandas as pd
 import streamlit as st
+from typing import Optional
 
 from src.colors import initialize_colors
 
@@ -18,38 +20,88 @@ def initialize_session_state():
     Sets up:
     - Colors: Centralized color definitions
     - df_core: The cleaned and validated dataframe
-    - data_version: Hash of the uploaded Excel file bytes
+    - data_version: Version identifier of df_core
     - selected_system_id: Currently selected subway system ID
     - S3 state flags: Track S3 table existence and loading status
     """
+    # Every rerun after the first in a session only pays for this lookup
+    if st.session_state.get("_initialized"):
+        return
+    
     # Initialize colors (must be called first)
     initialize_colors()
     
-    if "df_core" not in st.session_state:
-        st.session_state.df_core = None
+    session_state = st.session_state
+    session_state.setdefault("df_core", None)
+    session_state.setdefault("data_version", None)
+    session_state.setdefault("selected_system_id", None)
     
-    if "data_version" not in st.session_state:
-        st.session_state.data_version = None
+    # S3 state flags
+    session_state.setdefault("s3_table_checked", False)
+    session_state.setdefault("s3_table_exists", False)
+    session_state.setdefault("s3_table_loaded", False)
     
-    if "selected_system_id" not in st.session_state:
-        st.session_state.selected_system_id = None
+    session_state._initialized = True
+
+
+def get_df_core() -> Optional[pd.DataFrame]:
+    """
+    Get this session's core dataframe.
     
-    # S3 state flags
-    if "s3_table_checked" not in st.session_state:
-        st.session_state.s3_table_checked = False
+    Returns:
+        The cleaned and validated dataframe, or None if no data is loaded
+    """
+    return st.session_state.get("df_core")
+
+
+def get_data_version() -> Optional[str]:
+    """
+    Get the data version of this session's core dataframe.
+    
+    Returns:
+        Source label of df_core plus a digest of its contents, or None
+    """
+    return st.session_state.get("data_version")
+
+
+def _frame_digest(df: pd.DataFrame) -> str:
+    """
+    Hash a dataframe's column names and cell values.
+    
+    Args:
+        df: DataFrame to hash
+        
+    Returns:
+        A short hexadecimal hash string
+    """
+    hasher = hashlib.blake2b(digest_size=8)
+    hasher.update(repr(list(df.columns)).encode())
+    hasher.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+def set_df_core(df: pd.DataFrame, data_version: str) -> None:
+    """
+    Replace this session's core dataframe and its data version.
     
-    if "s3_table_exists" not in st.session_state:
-        st.session_state.s3_table_exists = False
+    A digest of the stored frame is appended to the version, so the derived
+    caches keyed on it never mix up two frames from the same source (e.g.
+    another sheet of one file, or a different geocoding outcome).
     
-    if "s3_table_loaded" not in st.session_state:
-        st.session_state.s3_table_loaded = False
+    Args:
+        df: The cleaned and validated dataframe
+        data_version: Source label for the data, e.g. the upload's file hash
+    """
+    st.session_state.df_core = df
+    st.session_state.data_version = f"{data_version}_{_frame_digest(df)}"
 
 
 def compute_data_version(file_bytes: bytes) -> str:
     """
     Compute a deterministic hash of the uploaded Excel file bytes.
     
-    This is used as part of the cache key for AI profiles.
+    This is used as part of the cache key for AI profiles. BLAKE2b is
+    faster than SHA-256 in hashlib and still collision-resistant.
     
     Args:
         file_bytes: The raw bytes of the uploaded Excel file
@@ -57,5 +109,4 @@ def compute_data_version(file_bytes: bytes) -> str:
     Returns:
         A hexadecimal hash string
     """
-    return hashlib.sha256(file_bytes).hexdigest()
-
+    return hashlib.blake2b(file_bytes, digest_size=32).hexdigest()
@@ -5,35 +5,52 @@ Validates uploaded Excel files against the schema contract defined in
 context_dd_core.md, providing human-readable error messages.
 """
 
+import numpy as np
 import pandas as pd
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 import re
 
 
 # Required columns as per context_dd_core.md
-REQUIRED_COLUMNS = ["SYSTEM_ID", "CITY", "COUNTRY"]
+REQUIRED_COLUMNS = ("SYSTEM_ID", "CITY", "COUNTRY")
 
 # Column name mappings from various formats to normalized names
 # Maps variations to standardized column names
 COLUMN_MAPPINGS = {
-    "CITY": ["CITY", "City"],
-    "COUNTRY": ["COUNTRY", "Country"],
-    "SYSTEM_ID": ["SYSTEM_ID", "Sequence"],
-    "SYSTEM_NAME": ["SYSTEM_NAME", "Name"],
-    "OPENED_YEAR": ["OPENED_YEAR", "Year opened (General Format)"],
-    "NUMBER_OF_LINES": ["NUMBER_OF_LINES", "Lines"],
-    "TOTAL_MILES": ["TOTAL_MILES", "System length   miles"],
-    "ANNUAL_RIDERSHIP": ["ANNUAL_RIDERSHIP", "Annual Ridership"],
-    "CITY_POPULATION": ["CITY_POPULATION"],
-    "VISITED": ["VISITED", "Ridden?"],
-    "LAST_MAJOR_UPDATE": ["LAST_MAJOR_UPDATE", "Year of last expansion"],
-    "STATIONS": ["Stations"],
-    "LATITUDE": ["LATITUDE"],
-    "LONGITUDE": ["LONGITUDE"],
+    "CITY": ("CITY", "City"),
+    "COUNTRY": ("COUNTRY", "Country"),
+    "SYSTEM_ID": ("SYSTEM_ID", "Sequence"),
+    "SYSTEM_NAME": ("SYSTEM_NAME", "Name"),
+    "OPENED_YEAR": ("OPENED_YEAR", "Year opened (General Format)"),
+    "NUMBER_OF_LINES": ("NUMBER_OF_LINES", "Lines"),
+    "TOTAL_MILES": ("TOTAL_MILES", "System length   miles"),
+    "ANNUAL_RIDERSHIP": ("ANNUAL_RIDERSHIP", "Annual Ridership"),
+    "CITY_POPULATION": ("CITY_POPULATION",),
+    "VISITED": ("VISITED", "Ridden?"),
+    "LAST_MAJOR_UPDATE": ("LAST_MAJOR_UPDATE", "Year of last expansion"),
+    "STATIONS": ("Stations",),
+    "LATITUDE": ("LATITUDE",),
+    "LONGITUDE": ("LONGITUDE",),
+}
+
+# Columns converted to numbers by convert_numeric_columns
+NUMERIC_COLUMNS = (
+    "OPENED_YEAR", "NUMBER_OF_LINES", "TOTAL_MILES",
+    "ANNUAL_RIDERSHIP", "CITY_POPULATION", "STATIONS",
+    "LAST_MAJOR_UPDATE", "LATITUDE", "LONGITUDE"
+)
+
+# Inverted COLUMN_MAPPINGS: variant -> (normalized name, priority). When several
+# variants of one name are present, the one listed first in COLUMN_MAPPINGS wins.
+_VARIANT_TO_NORMALIZED = {
+    variant: (normalized_name, priority)
+    for normalized_name, variants in COLUMN_MAPPINGS.items()
+    for priority, variant in enumerate(variants)
 }
 
 # Columns to ignore during validation
-IGNORE_COLUMNS = [
+IGNORE_COLUMNS = frozenset({
     "City",  # Use CITY instead
     "Year when First Ridden",
     "Continent",
@@ -43,7 +60,31 @@ IGNORE_COLUMNS = [
     "Visited but subway not ridden",
     "Logo",
     "Pre-1985?",
-]
+})
+
+
+# Text that astype(str) produces for missing cells (or that means "missing")
+_NULL_TOKENS = frozenset({'nan', 'None', '', 'NaT', '<NA>'})
+
+# Patterns used by normalize_column_name
+_RE_NON_WORD = re.compile(r'\W')
+_RE_UNDERSCORES = re.compile(r'_{2,}')
+
+# Patterns used by robust_to_numeric, compiled once instead of on every cell
+# Ridership scale words in one scan: each lookahead captures the first
+# "<number> billion" / "<number> million" anywhere in the cell, like re.search
+_RE_SCALED = re.compile(
+    r'^(?=(?:.*?(?P<billion>[\d,]+\.?\d*)\s*billion)?)'
+    r'(?=(?:.*?(?P<million>[\d,]+\.?\d*)\s*million)?)',
+    re.IGNORECASE | re.DOTALL
+)
+_RE_PARENS = re.compile(r'\([^)]*\)')
+_RE_NUMERIC = re.compile(r'([-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?)')
+_RE_DISTANCE = re.compile(
+    r'\(?\s*([-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?)\s*(?:mi|miles?|km|kilometers?)?\s*\)?',
+    re.IGNORECASE
+)
+_RE_YEAR = re.compile(r'(\d{4})')
 
 
 class ValidationError(Exception):
@@ -64,24 +105,29 @@ def normalize_column_name(col_name: str) -> str:
     if pd.isna(col_name):
         return str(col_name).upper()
     
-    # Convert to string and strip whitespace
-    normalized = str(col_name).strip()
-    
-    # Replace spaces with underscores
-    normalized = normalized.replace(" ", "_")
+    return _normalize_column_text(str(col_name))
+
+
+@lru_cache(maxsize=1024)
+def _normalize_column_text(text: str) -> str:
+    """
+    Normalize a column name string (cached; templates repeat the same headers).
     
-    # Replace special characters (keep only alphanumeric and underscore)
-    normalized = "".join(c if c.isalnum() or c == "_" else "_" for c in normalized)
+    Args:
+        text: Column name as a string
+        
+    Returns:
+        Normalized column name
+    """
+    # Replace every character that is not alphanumeric or an underscore
+    # (spaces included) with an underscore; \W is exactly "not isalnum() and not _"
+    normalized = _RE_NON_WORD.sub("_", text.strip())
     
     # Convert to uppercase
     normalized = normalized.upper()
     
-    # Remove multiple consecutive underscores
-    while "__" in normalized:
-        normalized = normalized.replace("__", "_")
-    
-    # Remove leading/trailing underscores
-    normalized = normalized.strip("_")
+    # Collapse runs of underscores and remove leading/trailing underscores
+    normalized = _RE_UNDERSCORES.sub("_", normalized).strip("_")
     
     return normalized
 
@@ -97,32 +143,36 @@ def map_columns_to_normalized(df: pd.DataFrame) -> pd.DataFrame:
         df: DataFrame with original column names
         
     Returns:
-        DataFrame with normalized column names
+        DataFrame with normalized column names (a new frame; the input is
+        not modified)
     """
-    df_copy = df.copy()
-    column_mapping = {}
-    
-    # Build mapping from original to normalized names
-    for normalized_name, variants in COLUMN_MAPPINGS.items():
-        for variant in variants:
-            if variant in df_copy.columns:
-                column_mapping[variant] = normalized_name
-                break
+    # Build mapping from original to normalized names in one pass over the
+    # columns, keeping the highest-priority variant of each normalized name
+    best_variants = {}
+    for col in df.columns:
+        match = _VARIANT_TO_NORMALIZED.get(col)
+        if match is None:
+            continue
+        normalized_name, priority = match
+        if normalized_name not in best_variants or priority < best_variants[normalized_name][1]:
+            best_variants[normalized_name] = (col, priority)
+    column_mapping = {col: normalized_name for normalized_name, (col, _) in best_variants.items()}
+    # Normalized names already taken, kept in step with column_mapping's values
+    used_normalized = set(best_variants)
     
     # For any unmapped columns, normalize them
-    for col in df_copy.columns:
+    for col in df.columns:
         if col not in column_mapping:
             normalized = normalize_column_name(col)
             # Only map if the normalized name is different and not already taken
-            if normalized != col and normalized not in column_mapping.values():
+            if normalized != col and normalized not in used_normalized:
                 # Check if this is an ignored column
                 if col not in IGNORE_COLUMNS:
                     column_mapping[col] = normalized
+                    used_normalized.add(normalized)
     
-    # Rename columns
-    df_copy = df_copy.rename(columns=column_mapping)
-    
-    return df_copy
+    # Rename columns (rename already returns a new frame, so no copy first)
+    return df.rename(columns=column_mapping)
 
 
 def validate_required_columns(df: pd.DataFrame) -> List[str]:
@@ -135,35 +185,46 @@ def validate_required_columns(df: pd.DataFrame) -> List[str]:
     Returns:
         List of missing required column names (empty if all present)
     """
-    missing = []
-    for col in REQUIRED_COLUMNS:
-        if col not in df.columns:
-            missing.append(col)
-    return missing
+    # Hash the column names once; keeps REQUIRED_COLUMNS order in the result
+    columns = set(df.columns)
+    return [col for col in REQUIRED_COLUMNS if col not in columns]
 
 
 def generate_system_id_if_missing(df: pd.DataFrame) -> pd.DataFrame:
     """
     Generate deterministic SYSTEM_ID if missing.
     
-    Uses CITY + COUNTRY to create a deterministic ID.
+    Uses CITY + COUNTRY to create a deterministic ID. The column is added to
+    df in place.
     
     Args:
         df: DataFrame that may be missing SYSTEM_ID
         
     Returns:
-        DataFrame with SYSTEM_ID column (generated if needed)
+        The same DataFrame, with SYSTEM_ID column (generated if needed)
     """
-    df_copy = df.copy()
-    
-    if "SYSTEM_ID" not in df_copy.columns or df_copy["SYSTEM_ID"].isna().all():
-        # Generate deterministic ID from CITY and COUNTRY
-        df_copy["SYSTEM_ID"] = (
-            df_copy.get("CITY", "").astype(str).str.strip() + "_" +
-            df_copy.get("COUNTRY", "").astype(str).str.strip()
-        ).str.upper().str.replace(" ", "_")
+    if "SYSTEM_ID" not in df.columns or df["SYSTEM_ID"].isna().all():
+        # Generate deterministic ID from CITY and COUNTRY. Cities and countries
+        # repeat, so the string work runs once per distinct pair, not per row.
+        city_codes, cities = pd.factorize(df["CITY"].astype(str))
+        country_codes, countries = pd.factorize(df["COUNTRY"].astype(str))
+        
+        # astype(str) keeps missing values as NaN (pandas 3), so they factorize
+        # to -1 and give a missing ID
+        has_both = (city_codes >= 0) & (country_codes >= 0)
+        pair_codes = city_codes[has_both].astype(np.int64) * len(countries) + country_codes[has_both]
+        pairs, pair_of_row = np.unique(pair_codes, return_inverse=True)
+        
+        # One concatenation, then a single upper-case pass and a literal (non-regex) replace
+        city = pd.Series(cities.take(pairs // max(len(countries), 1))).str.strip()
+        country = pd.Series(countries.take(pairs % max(len(countries), 1))).str.strip()
+        pair_ids = city.str.cat(country, sep="_").str.upper().str.replace(" ", "_", regex=False)
+        
+        system_ids = pd.Series(np.nan, index=df.index, dtype=pair_ids.dtype)
+        system_ids[has_both] = pair_ids.to_numpy()[pair_of_row]
+        df["SYSTEM_ID"] = system_ids
     
-    return df_copy
+    return df
 
 
 def convert_numeric_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
@@ -176,22 +237,17 @@ def convert_numeric_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
     - Parenthetical notes
     - Text annotations
     
+    Converted columns replace the originals in df in place.
+    
     Args:
         df: DataFrame to process
         
     Returns:
-        Tuple of (DataFrame with converted columns, list of conversion errors)
+        Tuple of (the same DataFrame with converted columns, list of conversion errors)
     """
     
-    df_copy = df.copy()
     errors = []
     
-    numeric_columns = [
-        "OPENED_YEAR", "NUMBER_OF_LINES", "TOTAL_MILES", 
-        "ANNUAL_RIDERSHIP", "CITY_POPULATION", "STATIONS",
-        "LAST_MAJOR_UPDATE", "LATITUDE", "LONGITUDE"
-    ]
-    
     def robust_to_numeric(series, column_name):
         """
         Convert a series to numeric, handling various formats.
@@ -199,106 +255,65 @@ def convert_numeric_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
         Returns:
             Tuple of (converted series, list of failed values)
         """
-        original_series = series.copy()
+        # astype returns new storage, so the input stays intact for the
+        # failed-values report without a copy
+        original_series = series
         converted = series.astype(str)
         
         # Handle NaN/None
-        mask = converted.isin(['nan', 'None', '', 'None', 'NaT', '<NA>'])
-        converted[mask] = None
+        converted[converted.isin(_NULL_TOKENS)] = None
         
-        # Extract numeric patterns for different column types
-        for idx in converted.index:
-            if pd.isna(converted.loc[idx]) or converted.loc[idx] in ['nan', 'None', '']:
-                continue
-                
-            val = str(converted.loc[idx]).strip()
-            
-            # Handle special cases by column type
-            if column_name == "ANNUAL_RIDERSHIP":
-                # Handle "X million" or "X billion" formats
-                billion_match = re.search(r'([\d,]+\.?\d*)\s*billion', val, re.IGNORECASE)
-                if billion_match:
-                    num = float(billion_match.group(1).replace(',', '')) * 1_000_000_000
-                    converted.loc[idx] = str(int(num))
-                    continue
-                
-                million_match = re.search(r'([\d,]+\.?\d*)\s*million', val, re.IGNORECASE)
-                if million_match:
-                    num = float(million_match.group(1).replace(',', '')) * 1_000_000
-                    converted.loc[idx] = str(int(num))
-                    continue
-                
-                # Remove common text annotations in parentheses for ANNUAL_RIDERSHIP
-                val = re.sub(r'\([^)]*\)', '', val).strip()
-                
-                # Try to extract numeric value (handles comma-separated numbers)
-                numeric_match = re.search(r'([-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?)', val)
-                if numeric_match:
-                    # Remove commas and convert
-                    num_str = numeric_match.group(1).replace(',', '')
-                    converted.loc[idx] = num_str
-                    continue
-                else:
-                    # No numeric value found - convert to NaN
-                    converted.loc[idx] = None
-                    continue
-            
-            elif column_name in ["TOTAL_MILES", "LATITUDE", "LONGITUDE"]:
-                # Replace non-breaking spaces with regular spaces
-                val = val.replace('\xa0', ' ').replace('\u00A0', ' ')
-                # Extract numeric value first, even if wrapped in parentheses (handles "(250 mi)" format)
-                # This regex looks for a number, optionally inside parentheses
-                numeric_match = re.search(r'\(?\s*([-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?)\s*(?:mi|miles?|km|kilometers?)?\s*\)?', val, re.IGNORECASE)
-                if numeric_match:
-                    # Extract just the number part
-                    num_str = numeric_match.group(1).replace(',', '')
-                    converted.loc[idx] = num_str
-                    continue
-                else:
-                    # Fallback: try to extract any number from the string
-                    numeric_match = re.search(r'([-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?)', val)
-                    if numeric_match:
-                        num_str = numeric_match.group(1).replace(',', '')
-                        converted.loc[idx] = num_str
-                        continue
-                    else:
-                        converted.loc[idx] = None
-                        continue
-            
-            elif column_name == "LAST_MAJOR_UPDATE":
-                # Extract year from dates or year strings (4-digit year pattern)
-                year_match = re.search(r'(\d{4})', val)
-                if year_match:
-                    converted.loc[idx] = year_match.group(1)
-                    continue
-                else:
-                    # No year pattern found - convert to NaN
-                    converted.loc[idx] = None
-                    continue
-            
-            elif column_name == "OPENED_YEAR":
-                # Extract year from dates or year strings (4-digit year pattern)
-                year_match = re.search(r'(\d{4})', val)
-                if year_match:
-                    converted.loc[idx] = year_match.group(1)
-                    continue
-                else:
-                    # No year pattern found - convert to NaN
-                    converted.loc[idx] = None
-                    continue
+        # Extract the numeric text for the whole column at once; cells without
+        # a match become NaN. Every branch searches the stripped text.
+        text = converted.str.strip()
+        
+        # Handle special cases by column type
+        if column_name == "ANNUAL_RIDERSHIP":
+            # Handle "X million" or "X billion" formats (billion wins if both appear)
+            scale_text = text.str.extract(_RE_SCALED)
+            billion_text = scale_text["billion"]
+            million_text = scale_text["million"]
+            has_scale = billion_text.notna() | million_text.notna()
+            scaled = (
+                pd.to_numeric(billion_text.str.replace(',', '', regex=False), errors='coerce') * 1_000_000_000
+            ).where(
+                billion_text.notna(),
+                pd.to_numeric(million_text.str.replace(',', '', regex=False), errors='coerce') * 1_000_000
+            )
             
-            # For other columns, remove common text annotations in parentheses
-            val = re.sub(r'\([^)]*\)', '', val)
+            # Remove common text annotations in parentheses, then take the first number
+            converted = (
+                text.str.replace(_RE_PARENS, '', regex=True)
+                .str.extract(_RE_NUMERIC, expand=False)
+                .str.replace(',', '', regex=False)
+            )
             
-            # Extract first numeric value (handles cases like "245.5 (approx)")
-            numeric_match = re.search(r'([-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?)', val)
-            if numeric_match:
-                # Remove commas and convert
-                num_str = numeric_match.group(1).replace(',', '')
-                converted.loc[idx] = num_str
-            else:
-                # No numeric pattern found
-                converted.loc[idx] = None
+            # Scaled values are truncated to whole riders, as int() did per cell
+            scaled_valid = (has_scale & scaled.notna()).to_numpy()
+            converted[has_scale.to_numpy()] = None
+            converted[scaled_valid] = scaled[scaled_valid].astype("int64").astype(str).to_numpy()
+        
+        elif column_name in ["TOTAL_MILES", "LATITUDE", "LONGITUDE"]:
+            # Replace non-breaking spaces, then extract the number even if wrapped
+            # in parentheses with a unit (handles "(250 mi)" format)
+            converted = (
+                text.str.replace('\xa0', ' ', regex=False)
+                .str.extract(_RE_DISTANCE, expand=False)
+                .str.replace(',', '', regex=False)
+            )
+        
+        elif column_name in ["LAST_MAJOR_UPDATE", "OPENED_YEAR"]:
+            # Extract year from dates or year strings (4-digit year pattern)
+            converted = text.str.extract(_RE_YEAR, expand=False)
+        
+        else:
+            # For other columns, remove text annotations in parentheses and take
+            # the first numeric value (handles cases like "245.5 (approx)")
+            converted = (
+                text.str.replace(_RE_PARENS, '', regex=True)
+                .str.extract(_RE_NUMERIC, expand=False)
+                .str.replace(',', '', regex=False)
+            )
         
         # Now convert to numeric
         result = pd.to_numeric(converted, errors='coerce')
@@ -309,49 +324,42 @@ def convert_numeric_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
         
         return result, failed_values
     
-    for col in numeric_columns:
-        if col in df_copy.columns:
-            original_values = df_copy[col].copy()
-            converted_series, failed_values = robust_to_numeric(df_copy[col], col)
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            converted_series, failed_values = robust_to_numeric(df[col], col)
             
-            # For ANNUAL_RIDERSHIP, LAST_MAJOR_UPDATE, and CITY_POPULATION, explicitly set failed conversions to NaN
-            # and suppress error reporting (these columns are expected to have some non-numeric values)
-            if col in ["ANNUAL_RIDERSHIP", "LAST_MAJOR_UPDATE", "CITY_POPULATION"]:
-                # Ensure any values that couldn't be converted are explicitly NaN
-                # Force any remaining non-numeric values to NaN as a final safety check
-                df_copy[col] = converted_series
-                # Additional explicit conversion to ensure all non-numeric are NaN
-                df_copy[col] = pd.to_numeric(df_copy[col], errors='coerce')
-                # Don't report errors for these columns - non-numeric values are expected and converted to NaN
-            else:
-                df_copy[col] = converted_series
-                # Report errors if any (for other columns)
-                if failed_values:
-                    errors.append(
-                        f"Column '{col}': Could not convert values to numeric. "
-                        f"Example failing values: {failed_values}"
-                    )
-    
-    return df_copy, errors
+            # robust_to_numeric already coerced failed conversions to NaN
+            df[col] = converted_series
+            
+            # Report errors if any, except for ANNUAL_RIDERSHIP, LAST_MAJOR_UPDATE, and CITY_POPULATION
+            # (these columns are expected to have some non-numeric values)
+            if failed_values and col not in ["ANNUAL_RIDERSHIP", "LAST_MAJOR_UPDATE", "CITY_POPULATION"]:
+                errors.append(
+                    f"Column '{col}': Could not convert values to numeric. "
+                    f"Example failing values: {failed_values}"
+                )
+    
+    return df, errors
 
 
 def parse_date_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
     """
     Parse date columns robustly.
     
+    Parsed columns would replace the originals in df in place.
+    
     Args:
         df: DataFrame to process
         
     Returns:
-        Tuple of (DataFrame with parsed dates, list of parsing errors)
+        Tuple of (the same DataFrame with parsed dates, list of parsing errors)
     """
-    df_copy = df.copy()
     errors = []
     
     # For now, date parsing is handled by numeric conversion for year columns
     # This can be extended for actual date columns if needed
     
-    return df_copy, errors
+    return df, errors
 
 
 def validate_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
@@ -378,20 +386,22 @@ def validate_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
     errors = []
     warnings = []
     
-    # Step 0: Filter out rows where "Sequence" is not numeric (before any data cleaning)
-    df_copy = df.copy()
-    if "Sequence" in df_copy.columns:
+    # Step 0: Filter out rows where "Sequence" is not numeric (before any data cleaning).
+    # No defensive copy: the rename in step 1 returns a new frame, and only that
+    # frame is modified in place by the later steps.
+    df_filtered = df
+    if "Sequence" in df.columns:
         # Convert Sequence to numeric, coercing errors to NaN
-        sequence_numeric = pd.to_numeric(df_copy["Sequence"], errors='coerce')
+        sequence_numeric = pd.to_numeric(df["Sequence"], errors='coerce')
         # Keep only rows where Sequence is numeric (not NaN after conversion)
         valid_mask = sequence_numeric.notna()
         rows_filtered = (~valid_mask).sum()
         if rows_filtered > 0:
-            df_copy = df_copy[valid_mask].copy()
+            df_filtered = df.loc[valid_mask]
             warnings.append(f"Filtered out {rows_filtered} row(s) with non-numeric 'Sequence' values.")
     
     # Step 1: Map and normalize column names
-    df_cleaned = map_columns_to_normalized(df_copy)
+    df_cleaned = map_columns_to_normalized(df_filtered)
     
     # Step 1.5: Ensure CITY_POPULATION column exists with NaN values if missing
     if "CITY_POPULATION" not in df_cleaned.columns: